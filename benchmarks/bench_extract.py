@@ -0,0 +1,45 @@
+from __future__ import annotations
+import argparse, json, pathlib, re, sys, time
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from benchmarks.synth import synthetic_filing
+from tools.html_fast import parse_html
+from tools.extract import extract_mentions, first_billions
+
+# Throughput of the single-pass mention extractor on parsed synthetic filings, next to the per-line
+# first-match loop that finance_calc_extract_first_billions used before (timed on a document whose only
+# match is on the last line, i.e. its worst case, which is also the cost of finding every mention that way).
+# Usage: python -m benchmarks.bench_extract --sizes-mb 1 5 20 [--json out.json]
+
+def _legacy_first_billions(text: str):
+    for line in text.splitlines():
+        s = line.replace(",", "")
+        m = re.search(r"\$?([\d]+(\.\d+)?)\s*(million|billion)", s, flags=re.I)
+        if m: return line.strip()
+    return None
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter(); fn(); return time.perf_counter() - t0
+
+def run(sizes_mb):
+    rows = []
+    for mb in sizes_mb:
+        text = parse_html(synthetic_filing(int(mb * (1 << 20)), seed=int(mb * 10)), tables=False)[0]
+        worst = re.sub(r"(?i)million|billion", "mil", text) + "\nTotal net sales were $1,000 million"
+        n_chars = len(text); res = {}
+        all_s = _timed(lambda: res.update(extract_mentions(text)))
+        nosent_s = _timed(lambda: extract_mentions(text, with_sentence=False))
+        legacy_s = _timed(lambda: _legacy_first_billions(worst)); first_s = _timed(lambda: first_billions(worst))
+        rows.append({"size_mb": mb, "chars": n_chars, "mentions": res["total"], "all_mentions_sec": round(all_s, 4),
+                     "all_mentions_no_sentence_sec": round(nosent_s, 4), "mb_per_sec": round(n_chars / (1 << 20) / all_s, 1),
+                     "first_billions_worst_sec": round(first_s, 4), "legacy_first_billions_worst_sec": round(legacy_s, 4)})
+    return rows
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 5, 20])
+    p.add_argument("--json", default=None, help="also write the rows to this file")
+    args = p.parse_args()
+    rows = run(args.sizes_mb)
+    for r in rows: print(json.dumps(r))
+    if args.json: pathlib.Path(args.json).write_text(json.dumps(rows, indent=2), encoding="utf-8")
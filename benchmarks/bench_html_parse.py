@@ -0,0 +1,41 @@
+from __future__ import annotations
+import argparse, json, pathlib, sys, time
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from benchmarks.synth import synthetic_filing
+from tools.html_fast import ParseCache, parse_html, parse_html_bs4
+
+# Compares the BeautifulSoup html_parse path with the lxml fast path (cold, with and without table extraction)
+# and the parse-result cache (warm).
+# Usage: python -m benchmarks.bench_html_parse --sizes-mb 1 5 10 [--json out.json]
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+    return best
+
+def run(sizes_mb, repeat: int):
+    rows = []
+    for mb in sizes_mb:
+        html = synthetic_filing(int(mb * (1 << 20)), seed=int(mb * 10))
+        ref, fast = parse_html_bs4(html), parse_html(html, tables=False)[:2]
+        cache = ParseCache(8); cache.put(ParseCache.key(html), fast)
+        bs4_s = _best(lambda: parse_html_bs4(html), repeat)
+        lxml_s = _best(lambda: parse_html(html, tables=False), repeat)
+        tables_s = _best(lambda: parse_html(html), repeat)
+        warm_s = _best(lambda: cache.get(ParseCache.key(html)), repeat)
+        rows.append({"size_mb": mb, "bytes": len(html), "identical_output": ref == fast, "bs4_sec": round(bs4_s, 4),
+                     "lxml_sec": round(lxml_s, 4), "lxml_with_tables_sec": round(tables_s, 4), "cached_sec": round(warm_s, 5), "speedup": round(bs4_s / lxml_s, 2),
+                     "lxml_mb_per_sec": round(len(html) / (1 << 20) / lxml_s, 1)})
+    return rows
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 5, 10])
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--json", default=None, help="also write the rows to this file")
+    args = p.parse_args()
+    rows = run(args.sizes_mb, args.repeat)
+    for r in rows: print(json.dumps(r))
+    if args.json: pathlib.Path(args.json).write_text(json.dumps(rows, indent=2), encoding="utf-8")
@@ -0,0 +1,176 @@
+from __future__ import annotations
+import argparse, copy, json, os, pathlib, platform, random, subprocess, sys, tempfile, time
+from typing import Any, Dict, List, Optional, Tuple
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+# End-to-end load test of the launcher stack (tools hub + green + purple), fully offline.
+# Builds a synthetic corpus of N tasks from the sample tasks over tools/static plus large synthetic filings (served by a
+# local http.server), runs it through the same lanes/shards as launcher.py and reports tasks/sec, task latency
+# percentiles, per-tool latency scraped from /metrics and the peak RSS of every service process.
+# Usage: python -m benchmarks.bench_stack --tasks 1000 --filing-mb 1 5 --purple-replicas 2 --json stack.json [--baseline old.json]
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+SAMPLE_TASKS = ROOT / "data" / "tasks" / "sample_tasks.json"
+
+def _filing_expectation(html: str) -> Optional[float]:
+    # what a correct purple agent should answer: the first million/billion mention of the parsed text
+    from tools.html_fast import parse_html
+    from tools.extract import first_billions
+    return first_billions(parse_html(html, tables=False)[0])["value_billions"]
+
+def write_filings(doc_dir: pathlib.Path, sizes_mb: List[float], count: int, seed: int) -> List[Tuple[str, float]]:
+    from benchmarks.synth import synthetic_filing
+    doc_dir.mkdir(parents=True, exist_ok=True); out = []
+    for i in range(count):
+        mb = sizes_mb[i % len(sizes_mb)]; html = synthetic_filing(int(mb * (1 << 20)), seed=seed + i)
+        name = f"filing_{i:03d}_{mb:g}mb.html"; (doc_dir / name).write_text(html, encoding="utf-8")
+        out.append((name, _filing_expectation(html)))
+    return out
+
+def write_corpus(path: pathlib.Path, n: int, tools_url: str, doc_url: str, filings: List[Tuple[str, float]], filing_share: float, seed: int) -> Dict[str, int]:
+    """Task i is a synthetic-filing numeric task with probability filing_share, else a copy of one of the sample tasks."""
+    templates = json.loads(SAMPLE_TASKS.read_text(encoding="utf-8")); rng = random.Random(seed); mix: Dict[str, int] = {}
+    for t in templates: t["context_urls"] = [f"{tools_url}/static/{u.rsplit('/', 1)[1]}" for u in t.get("context_urls") or []]
+    numeric = next(t for t in templates if (t.get("expected") or {}).get("type") == "numeric")
+    with path.open("w", encoding="utf-8") as f:
+        for i in range(n):
+            if filings and rng.random() < filing_share:
+                name, value = filings[rng.randrange(len(filings))]; t = copy.deepcopy(numeric); kind = "filing"
+                t["context_urls"] = [f"{doc_url}/{name}"]; t["expected"] = {"type": "numeric", "value": value, "tolerance": 0.5, "units": "USD_billion"}
+            else:
+                t = copy.deepcopy(templates[i % len(templates)]); kind = t["task_id"]
+            t["task_id"] = f"bench-{i:06d}"; mix[kind] = mix.get(kind, 0) + 1
+            f.write(json.dumps(t) + "\n")
+    return mix
+
+def start_doc_server(directory: pathlib.Path, port: int) -> subprocess.Popen:
+    import requests
+    p = subprocess.Popen([sys.executable, "-m", "http.server", str(port), "--bind", "127.0.0.1", "--directory", str(directory)],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200: return p
+        except Exception: time.sleep(0.1)
+    p.terminate(); raise RuntimeError(f"document server did not start on port {port}")
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    # VmHWM is the resident-set high-water mark of the process (Linux)
+    try:
+        for line in pathlib.Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"): return round(int(line.split()[1]) / 1024, 1)
+    except OSError: pass
+    return None
+
+def parse_metrics(text: str) -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+    out: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"): continue
+        series, value = line.rsplit(" ", 1); labels: Dict[str, str] = {}
+        if "{" in series:
+            series, raw = series[:-1].split("{", 1)
+            for pair in raw.split('",'):
+                if pair: k, v = pair.split("=", 1); labels[k] = v.strip('"')
+        out.setdefault(series, []).append((labels, float(value)))
+    return out
+
+def histogram_summary(scrapes: List[Dict[str, List[Tuple[Dict[str, str], float]]]], name: str, by: str) -> Dict[str, Dict[str, Any]]:
+    """Merges one histogram across processes, grouped by label `by`: count, mean and bucket-interpolated p50/p95/p99 (ms)."""
+    groups: Dict[str, Dict[str, Any]] = {}
+    for m in scrapes:
+        for labels, v in m.get(f"{name}_bucket", []):
+            g = groups.setdefault(labels.get(by, ""), {"buckets": {}, "sum": 0.0, "count": 0.0})
+            le = float("inf") if labels["le"] == "+Inf" else float(labels["le"]); g["buckets"][le] = g["buckets"].get(le, 0.0) + v
+        for suffix in ("sum", "count"):
+            for labels, v in m.get(f"{name}_{suffix}", []): groups[labels.get(by, "")][suffix] += v
+    out = {}
+    for key, g in groups.items():
+        bounds = sorted(g["buckets"].items()); n = g["count"]; row = {"count": int(n), "mean_ms": round(1000 * g["sum"] / n, 3) if n else None}
+        for q in (0.5, 0.95, 0.99):
+            target = q * n; lo, prev = 0.0, 0.0; val = None
+            for le, cum in bounds:
+                if cum >= target and n:
+                    hi = le if le != float("inf") else lo
+                    val = lo + (hi - lo) * ((target - prev) / (cum - prev) if cum > prev else 0.0); break
+                lo, prev = le, cum
+            row[f"p{int(q * 100)}_ms"] = None if val is None else round(1000 * val, 3)
+        out[key] = row
+    return out
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Relative changes beyond max_regression in the direction that is worse."""
+    checks = [("tasks_per_sec", True), ("task_latency_p95_sec", False), ("accuracy", True), ("startup_sec.total", False)] + \
+             [(f"peak_rss_mb.{k}", False) for k in (baseline.get("peak_rss_mb") or {})]
+    bad = []
+    for key, higher_better in checks:
+        new, old = result, baseline
+        for part in key.split("."): new = (new or {}).get(part); old = (old or {}).get(part)
+        if not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or not old: continue
+        change = (new - old) / old
+        if (-change if higher_better else change) > max_regression: bad.append(f"{key}: {old} -> {new} ({change:+.1%})")
+    return bad
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Offline load test of the tools/green/purple stack")
+    p.add_argument("--tasks", type=int, default=1000, help="number of synthetic tasks")
+    p.add_argument("--filing-mb", type=float, nargs="+", default=[1.0, 5.0], help="sizes of the synthetic filings (cycled)")
+    p.add_argument("--filings", type=int, default=4, help="distinct synthetic filings")
+    p.add_argument("--filing-share", type=float, default=0.1, help="fraction of tasks that read a synthetic filing")
+    p.add_argument("--purple-replicas", type=int, default=1)
+    p.add_argument("--tools-workers", type=int, default=1)
+    p.add_argument("--shards", type=int, default=None, help="defaults to 1, or 4 per purple replica when there are several")
+    p.add_argument("--max-concurrency", type=int, default=8)
+    p.add_argument("--port-base", type=int, default=7101, help="first service port; the document server uses port-base - 1")
+    p.add_argument("--workdir", default=None, help="corpus, documents, HTTP cache and outputs (default: a fresh temp dir)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", default=None, help="write the result to this file")
+    p.add_argument("--baseline", default=None, help="result file of an earlier run to compare against")
+    p.add_argument("--max-regression", type=float, default=0.1, help="relative change that counts as a regression (exit code 1)")
+    args = p.parse_args(argv)
+    shards = args.shards or (1 if args.purple_replicas == 1 else 4 * args.purple_replicas)
+    work = pathlib.Path(args.workdir or tempfile.mkdtemp(prefix="bench_stack_")).resolve(); work.mkdir(parents=True, exist_ok=True)
+    # the service modules read these at import time, so they are set before launcher is imported
+    os.environ.update({"AB_OUTPUT_DIR": str(work / "outputs"), "GREEN_TASKS_ROOT": str(work), "TOOLS_CACHE_DIR": str(work / "http_cache")})
+    import requests, launcher
+
+    tools_url = f"http://{launcher.HOST}:{args.port_base}"; doc_port = args.port_base - 1
+    t0 = time.time(); filings = write_filings(work / "docs", args.filing_mb, args.filings, args.seed) if args.filing_share > 0 else []
+    mix = write_corpus(work / "corpus.jsonl", args.tasks, tools_url, f"http://127.0.0.1:{doc_port}", filings, args.filing_share, args.seed)
+    print(f"corpus: {args.tasks} tasks {mix} in {time.time() - t0:.1f}s -> {work}", file=sys.stderr)
+
+    doc_server = start_doc_server(work / "docs", doc_port) if filings else None
+    procs, urls = launcher.start_services(args.purple_replicas, args.tools_workers, args.port_base)
+    try:
+        names = [f"{k}-{i}" for k in ("tools", "green", "purple") for i in range(len(urls[k]))]  # start_services' process order
+        idle_rss = {n: peak_rss_mb(pr.pid) for n, pr in zip(names, procs)}
+        run = launcher.run_sharded(urls, {"path": "corpus.jsonl"}, shards, args.max_concurrency, False, None, keep_results=False, verbose=False)
+        summary = run["summary"]
+        scrapes = {k: [parse_metrics(requests.get(f"{u}/metrics", timeout=10).text) for u in urls[k]] for k in ("tools", "green", "purple")}
+        rss = {n: peak_rss_mb(pr.pid) for n, pr in zip(names, procs)}
+    finally:
+        launcher.stop_services(procs)
+        if doc_server is not None: doc_server.terminate(); doc_server.wait(timeout=5)
+
+    try: commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception: commit = None
+    result = {
+        "commit": commit, "python": platform.python_version(), "cpus": os.cpu_count(), "timestamp": round(time.time()),
+        "params": {k: getattr(args, k) for k in ("tasks", "filing_mb", "filings", "filing_share", "purple_replicas", "tools_workers", "max_concurrency", "seed")} | {"shards": shards},
+        "task_mix": mix, "num_tasks": summary["num_tasks"], "accuracy": summary["accuracy"], "num_errors": summary["num_errors"],
+        "wall_sec": summary["time_used_sec"], "tasks_per_sec": summary["tasks_per_sec"],
+        "task_latency_p50_sec": summary.get("task_latency_p50_sec"), "task_latency_p95_sec": summary.get("task_latency_p95_sec"),
+        "task_latency_p99_sec": summary.get("task_latency_p99_sec"),
+        "tool_latency": histogram_summary(scrapes["tools"], "tools_call_duration_seconds", "tool"),
+        "stage_latency": histogram_summary(scrapes["tools"], "tools_stage_duration_seconds", "stage"),
+        "participant_latency": histogram_summary(scrapes["green"], "green_participant_duration_seconds", "category"),
+        "peak_rss_mb": rss, "idle_rss_mb": idle_rss, "startup_sec": dict(launcher.STARTUP_SEC),
+    }
+    print(json.dumps(result, indent=2))
+    if args.json: pathlib.Path(args.json).write_text(json.dumps(result, indent=2), encoding="utf-8")
+    if args.baseline:
+        bad = compare(result, json.loads(pathlib.Path(args.baseline).read_text(encoding="utf-8")), args.max_regression)
+        for line in bad: print(f"REGRESSION {line}", file=sys.stderr)
+        if bad: sys.exit(1)
+
+if __name__ == "__main__":
+    import multiprocessing as mp
+    mp.set_start_method("spawn", force=True); main()
@@ -0,0 +1,42 @@
+from __future__ import annotations
+import random
+from typing import List
+
+# Deterministic synthetic filings for benchmarks: 10-K style prose, financial tables, links and script/style noise,
+# seeded so that every run (and every commit) measures the same bytes.
+SEGMENTS = ["iPhone", "Mac", "iPad", "Services", "Wearables", "Cloud", "Gaming", "Search and news advertising"]
+METRICS = ["Net sales", "Cost of sales", "Gross margin", "Operating income", "Net income", "Research and development"]
+
+def _money(rng: random.Random) -> str:
+    if rng.random() < 0.5: return f"${rng.randint(1, 999):,}.{rng.randint(0, 9)} billion"
+    return f"${rng.randint(1, 999_999):,} million"
+
+def _paragraph(rng: random.Random) -> str:
+    seg = rng.choice(SEGMENTS); met = rng.choice(METRICS)
+    return (f"<p>{met} for {seg} was {_money(rng)} in fiscal {rng.randint(2015, 2024)}, "
+            f"{'an increase' if rng.random() < 0.5 else 'a decrease'} of {rng.randint(1, 40)}% compared to the prior year. "
+            f"Diluted EPS was ${rng.randint(0, 12)}.{rng.randint(10, 99)} versus consensus of ${rng.randint(0, 12)}.{rng.randint(10, 99)}. "
+            f"See <a href=\"https://www.sec.gov/Archives/edgar/data/{rng.randint(1000, 99999)}.htm\">Note {rng.randint(1, 20)}</a>.</p>")
+
+def _table(rng: random.Random) -> str:
+    years = sorted(rng.sample(range(2015, 2025), 3), reverse=True)
+    head = "".join(f"<th>{y}</th>" for y in years)
+    rows = "".join(
+        f"<tr><td>{m}</td>" + "".join(f"<td>{'(' if rng.random() < 0.1 else ''}{rng.randint(100, 400_000):,}{')' if rng.random() < 0.1 else ''}</td>" for _ in years) + "</tr>"
+        for m in rng.sample(METRICS, 4))
+    return f"<table><caption>(in millions)</caption><tr><th></th>{head}</tr>{rows}</table>"
+
+def synthetic_filing(target_bytes: int = 5 << 20, seed: int = 0) -> str:
+    rng = random.Random(seed); parts: List[str] = ["<!DOCTYPE html><html><head><title>Form 10-K</title>",
+        "<style>td{text-align:right}</style><script>var tracking = {};</script></head><body>"]
+    size = sum(len(p) for p in parts); section = 0
+    while size < target_bytes:
+        section += 1
+        chunk = [f"<h2>Item {section}. {rng.choice(SEGMENTS)} results</h2>"]
+        chunk += [_paragraph(rng) for _ in range(rng.randint(3, 8))]
+        if rng.random() < 0.6: chunk.append(_table(rng))
+        if rng.random() < 0.1: chunk.append("<script>window.dataLayer.push({});</script><!-- page break -->")
+        block = "<div class=\"section\">" + "".join(chunk) + "</div>"
+        parts.append(block); size += len(block)
+    parts.append("</body></html>")
+    return "".join(parts)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import bisect, math, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Minimal in-process metrics in the Prometheus text exposition format (0.0.4), so services need no client library.
+# Series are keyed by label values and every update takes one short lock, which keeps them safe from worker threads.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+def _num(v: float) -> str:
+    return "+Inf" if v == math.inf else repr(float(v))
+
+def _esc(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class _Metric:
+    kind = ""
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name; self.help = help; self.labels = tuple(labels); self._lock = threading.Lock(); self._series: Dict[Tuple[str, ...], Any] = {}
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(l, "")) for l in self.labels)
+    def _fmt(self, key: Tuple[str, ...], extra: Iterable[Tuple[str, str]] = ()) -> str:
+        pairs = [*zip(self.labels, key), *extra]
+        return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+class Counter(_Metric):
+    kind = "counter"
+    def inc(self, amount: float = 1.0, **labels):
+        k = self._key(labels)
+        with self._lock: self._series[k] = self._series.get(k, 0.0) + amount
+    def render(self) -> List[str]:
+        with self._lock: items = list(self._series.items())
+        return [f"{self.name}{self._fmt(k)} {_num(v)}" for k, v in items]
+
+class Histogram(_Metric):
+    kind = "histogram"
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels); self.buckets = tuple(sorted(buckets))
+    def observe(self, value: float, **labels):
+        k = self._key(labels); i = bisect.bisect_left(self.buckets, value)  # le is inclusive
+        with self._lock:
+            s = self._series.get(k)
+            if s is None: s = self._series[k] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1; s[1] += value; s[2] += 1
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.observe(time.perf_counter() - t0, **labels)
+    def render(self) -> List[str]:
+        with self._lock: items = [(k, list(c), total, n) for k, (c, total, n) in self._series.items()]
+        out: List[str] = []
+        for k, counts, total, n in items:
+            acc = 0
+            for b, c in zip(self.buckets + (math.inf,), counts):
+                acc += c; out.append(f"{self.name}_bucket{self._fmt(k, [('le', _num(b))])} {acc}")
+            out += [f"{self.name}_sum{self._fmt(k)} {_num(total)}", f"{self.name}_count{self._fmt(k)} {n}"]
+        return out
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}; self._lock = threading.Lock()
+    def _add(self, m: _Metric):
+        with self._lock: return self._metrics.setdefault(m.name, m)
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in list(self._metrics.values()): lines += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {m.kind}", *m.render()]
+        return "\n".join(lines) + "\n"
+
+class HttpMetrics:
+    """ASGI middleware recording per-route latency and request/response body bytes (streamed bodies included)."""
+    def __init__(self, app, registry: Registry, prefix: str):
+        self.app = app; self.routes: Optional[set] = None
+        self.latency = registry.histogram(f"{prefix}_http_request_duration_seconds", "HTTP request latency, until the last body chunk is sent", ("method", "path", "status"))
+        self.bytes_in = registry.counter(f"{prefix}_http_request_bytes_total", "HTTP request body bytes received", ("path",))
+        self.bytes_out = registry.counter(f"{prefix}_http_response_bytes_total", "HTTP response body bytes sent", ("path",))
+
+    def _path(self, scope) -> str:
+        # label by route, not raw path, so static files and bad URLs cannot blow up the series count
+        if self.routes is None: self.routes = {getattr(r, "path", None) for r in scope["app"].routes}
+        # under a Mount (launcher's in-process mode) scope["path"] still carries the mount prefix, which is in root_path
+        path = scope["path"]; root = scope.get("root_path", "")
+        if root and path.startswith(root): path = path[len(root):] or "/"
+        if path in self.routes: return path
+        head = "/" + path.split("/", 2)[1]
+        return head if head in self.routes else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http": return await self.app(scope, receive, send)
+        path = self._path(scope); t0 = time.perf_counter(); st = {"status": 500, "in": 0, "out": 0}
+        async def recv():
+            msg = await receive()
+            if msg["type"] == "http.request": st["in"] += len(msg.get("body", b""))
+            return msg
+        async def snd(msg):
+            if msg["type"] == "http.response.start": st["status"] = msg["status"]
+            elif msg["type"] == "http.response.body": st["out"] += len(msg.get("body", b""))
+            await send(msg)
+        try: await self.app(scope, recv, snd)
+        finally:
+            self.latency.observe(time.perf_counter() - t0, method=scope["method"], path=path, status=st["status"])
+            self.bytes_in.inc(st["in"], path=path); self.bytes_out.inc(st["out"], path=path)
+
+def instrument(app, registry: Registry, prefix: str):
+    """Adds HttpMetrics and a GET /metrics endpoint serving `registry` to a FastAPI app."""
+    from fastapi.responses import Response
+    app.add_middleware(HttpMetrics, registry=registry, prefix=prefix)
+    app.add_api_route("/metrics", lambda: Response(registry.render(), media_type=CONTENT_TYPE), methods=["GET"], include_in_schema=False)
+
+def percentiles(values: Sequence[float], qs: Sequence[float] = (0.5, 0.95, 0.99)) -> List[Optional[float]]:
+    """Nearest-rank percentiles; None for each q when there are no values."""
+    if not values: return [None for _ in qs]
+    s = sorted(values); n = len(s)
+    return [s[min(n - 1, max(0, math.ceil(q * n) - 1))] for q in qs]
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 class RubricItem(BaseModel):
     id: str
@@ -31,6 +31,19 @@ class FinanceResearchTask(BaseModel):
     context_urls: Optional[List[str]] = None
     expected: Optional[Dict[str, Any]] = None
 
+class TaskSource(BaseModel):
+    """Reference to a task corpus on the evaluator's disk, streamed instead of sent inline."""
+    path: str
+    shard_index: int = Field(default=0, ge=0)
+    shard_count: int = Field(default=1, ge=1)
+    categories: Optional[List[str]] = None
+    limit: Optional[int] = Field(default=None, ge=0)
+
+    @model_validator(mode="after")
+    def _shard_in_range(self):
+        if self.shard_index >= self.shard_count: raise ValueError("shard_index must be < shard_count")
+        return self
+
 class SourceItem(BaseModel):
     url: str
     name: Optional[str] = None
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import json, pathlib
+from typing import Callable, Iterator, Optional
+from common.schemas import FinanceResearchTask, TaskSource
+
+# Streaming task corpus loader. JSONL corpora (one FinanceResearchTask per line) are read line by line and each
+# task is validated only when it is selected, so memory stays flat however large the corpus. A .json file holding
+# a list is still accepted for small corpora like data/tasks/sample_tasks.json, but is read whole.
+
+class TaskCorpusError(ValueError):
+    pass
+
+def _raw_rows(path: pathlib.Path) -> Iterator[tuple]:
+    """Opens (JSONL) or reads and decodes (.json list) the corpus right away, so an unreadable corpus raises
+    TaskCorpusError here rather than from the first next(); then yields (line_no, raw) where raw is a JSON string
+    (JSONL) or an already decoded dict (.json list)."""
+    if path.suffix == ".json":
+        try: rows = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e: raise TaskCorpusError(f"{path}: cannot read task list: {e}") from e
+        if not isinstance(rows, list): raise TaskCorpusError(f"{path}: expected a JSON list of tasks")
+        return enumerate(rows, 1)
+    try: f = path.open("r", encoding="utf-8", errors="replace")  # undecodable bytes make an invalid row, not a failed run
+    except OSError as e: raise TaskCorpusError(f"{path}: cannot open: {e}") from e
+    def lines():
+        with f:
+            for i, line in enumerate(f, 1):
+                if line.strip(): yield i, line
+    return lines()
+
+def iter_tasks(path: pathlib.Path, shard_index: int = 0, shard_count: int = 1, categories: Optional[list] = None,
+               limit: Optional[int] = None, on_invalid: Optional[Callable[[TaskCorpusError], None]] = None) -> Iterator[FinanceResearchTask]:
+    """Task k of the corpus (0-based, blank lines skipped) belongs to shard k % shard_count. An invalid row raises
+    TaskCorpusError, or with `on_invalid` set is passed to it as one and skipped (it does not count towards `limit`).
+    The corpus is opened (and a .json list decoded) before this returns."""
+    if not 0 <= shard_index < shard_count: raise TaskCorpusError(f"shard_index {shard_index} out of range for shard_count {shard_count}")
+    return _select(path, _raw_rows(path), shard_index, shard_count, set(categories) if categories else None, limit, on_invalid)
+
+def _select(path: pathlib.Path, raw_rows: Iterator[tuple], shard_index: int, shard_count: int, wanted: Optional[set], limit: Optional[int],
+            on_invalid: Optional[Callable[[TaskCorpusError], None]]) -> Iterator[FinanceResearchTask]:
+    k = -1; n = 0
+    for line_no, raw in raw_rows:
+        k += 1
+        if k % shard_count != shard_index: continue
+        if limit is not None and n >= limit: return
+        try:
+            if wanted is None: task = FinanceResearchTask.model_validate_json(raw) if isinstance(raw, str) else FinanceResearchTask.model_validate(raw)
+            else:
+                row = json.loads(raw) if isinstance(raw, str) else raw
+                if not isinstance(row, dict): raise ValueError(f"expected a JSON object, got {type(row).__name__}")
+                if row.get("category") not in wanted: continue
+                task = FinanceResearchTask.model_validate(row)
+        except ValueError as e:
+            err = TaskCorpusError(f"{path}:{line_no}: invalid task: {e}")
+            if on_invalid is None: raise err from e
+            on_invalid(err); continue
+        n += 1
+        yield task
+
+def iter_source(source: TaskSource, root: Optional[pathlib.Path] = None,
+                on_invalid: Optional[Callable[[TaskCorpusError], None]] = None) -> Iterator[FinanceResearchTask]:
+    return iter_tasks(resolve_path(source.path, root), source.shard_index, source.shard_count, source.categories, source.limit, on_invalid)
+
+def resolve_path(path: str, root: Optional[pathlib.Path] = None) -> pathlib.Path:
+    # relative paths are taken from `root`; with a root set, the resolved path must stay inside it
+    p = pathlib.Path(path)
+    if root is not None:
+        p = (root / p).resolve()
+        if not p.is_relative_to(root.resolve()): raise TaskCorpusError(f"task source {path!r} is outside {root}")
+    if not p.is_file(): raise TaskCorpusError(f"task source {path!r} not found")
+    return p
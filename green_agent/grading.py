@@ -0,0 +1,152 @@
+from __future__ import annotations
+import re, statistics
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+from pydantic import BaseModel
+from common.schemas import FinanceResearchTask, AnswerSchema, PerTaskResult
+from common.metrics import percentiles
+
+# Grading engine shared by /assess (one answer at a time) and the offline re-scorer (whole batches).
+NUMERIC_RE = re.compile(r"([\d]+(\.\d+)?)\s*(?:USD\s*)?billions?", re.I)
+EPS_RE = re.compile(r"eps[^$]*\$(\d+(\.\d+)?)", re.I)
+RUN_DETAILS = ("error", "elapsed_sec")  # set by the dispatcher, not the grader; carried over when re-scoring
+
+class GradingConfig(BaseModel):
+    tolerance: Optional[float] = None           # overrides expected.tolerance on numeric tasks when set
+    default_tolerance: float = 0.5              # used when a numeric task has no expected.tolerance
+    missing_sources_penalty: float = 0.5        # score multiplier when must_cite and no sources are given
+    disallowed_domains_penalty: float = 0.5     # score multiplier when a source falls outside allowed_domains
+
+DEFAULT_CONFIG = GradingConfig()
+
+class DomainIndex:
+    """Parsed-hostname index over an allowed_domains list.
+
+    "sec.gov" allows sec.gov and any subdomain; "127.0.0.1:7001" must match host:port; an entry with a path
+    ("sec.gov/Archives") must prefix the source's host + path.
+    """
+    def __init__(self, allowed: FrozenSet[str]):
+        self.hosts: set = set(); self.netlocs: set = set(); self.suffixes: List[str] = []; self.prefixes: List[str] = []
+        for d in allowed:
+            d = d.strip().lower()
+            if not d: continue
+            if "://" in d: d = d.split("://", 1)[1]
+            if "/" in d.rstrip("/"): self.prefixes.append(d.rstrip("/")); continue
+            d = d.rstrip("/")
+            if ":" in d: self.netlocs.add(d)
+            else: self.hosts.add(d); self.suffixes.append("." + d)
+        self.suffixes_t = tuple(self.suffixes); self.prefixes_t = tuple(self.prefixes)
+
+    def allows(self, url: str) -> bool:
+        parts = _split_url(url)
+        if parts is None: return False  # unparseable, e.g. "http://[bad"
+        host, netloc, path = parts
+        if host in self.hosts or (self.suffixes_t and host.endswith(self.suffixes_t)): return True
+        if self.netlocs and netloc in self.netlocs: return True
+        return bool(self.prefixes_t) and (netloc + path).startswith(self.prefixes_t)
+
+@lru_cache(maxsize=65536)
+def _split_url(url: str) -> Optional[Tuple[str, str, str]]:
+    # source URLs repeat heavily across a benchmark, so each is parsed once; None if the URL cannot be parsed
+    try:
+        parts = urlsplit(url if "//" in url else "//" + url)
+        return (parts.hostname or "").lower(), parts.netloc.lower(), parts.path
+    except ValueError: return None
+
+@lru_cache(maxsize=4096)
+def domain_index(allowed: FrozenSet[str]) -> DomainIndex:
+    return DomainIndex(allowed)
+
+def _numeric(val: Optional[float], exp: Dict[str, Any], config: GradingConfig, details: Dict[str, Any]) -> bool:
+    tol = config.tolerance if config.tolerance is not None else float(exp.get("tolerance", config.default_tolerance))
+    details["parsed_value_bil"] = val; details["expected_value_bil"] = exp.get("value")
+    return val is not None and abs(val - float(exp.get("value"))) <= tol
+
+def _beat_miss(text_lower: str, eps: Optional[float], exp: Dict[str, Any], details: Dict[str, Any]) -> bool:
+    want = (exp.get("result") or "").lower()  # "beat" or "miss"
+    classified = "beat" if "beat" in text_lower else ("miss" if "miss" in text_lower else "unknown")
+    details["classified"] = classified
+    consensus = exp.get("consensus"); direction_ok = None
+    if eps is not None and isinstance(consensus, (int, float)):
+        direction_ok = ((eps - float(consensus)) > 0) == (want == "beat")
+    details.update({"eps": eps, "consensus": consensus, "direction_ok": direction_ok})
+    return bool(classified == want and (direction_ok is not False))
+
+def _evidence(task: FinanceResearchTask, answer: AnswerSchema, score: float, config: GradingConfig, details: Dict[str, Any]) -> float:
+    must_cite = bool(getattr(task.evidence_policy, "must_cite", True))
+    allowed = getattr(task.evidence_policy, "allowed_domains", None)
+    urls = [s.url for s in (answer.sources or []) if getattr(s, "url", None)]
+    if must_cite and not urls:
+        score *= config.missing_sources_penalty
+        details["penalty_missing_sources"] = True
+    if allowed and urls:
+        ix = domain_index(frozenset(allowed))
+        bad = [u for u in urls if not ix.allows(u)]
+        if bad:
+            score *= config.disallowed_domains_penalty
+            details["penalty_disallowed_domains"] = bad
+    return score
+
+def _parse_float(m) -> Optional[float]:
+    return float(m.group(1)) if m else None
+
+def grade(task: FinanceResearchTask, answer: AnswerSchema, config: GradingConfig = DEFAULT_CONFIG) -> PerTaskResult:
+    success = False; score = 0.0; details: Dict[str, Any] = {}
+    exp = task.expected or {}
+    if exp.get("type") == "numeric":
+        success = _numeric(_parse_float(NUMERIC_RE.search(answer.final_answer)), exp, config, details)
+    elif exp.get("type") == "beat_miss":
+        success = _beat_miss(answer.final_answer.lower(), _parse_float(EPS_RE.search(answer.final_answer)), exp, details)
+    score = _evidence(task, answer, 1.0 if success else 0.0, config, details)
+    return PerTaskResult(task_id=task.task_id, category=task.category, success=bool(success), score=float(score), details=details, answer=answer)
+
+def grade_batch(tasks: Sequence[FinanceResearchTask], answers: Sequence[AnswerSchema], config: GradingConfig = DEFAULT_CONFIG) -> List[PerTaskResult]:
+    """Same results as [grade(t, a) for ...]; the answer-text parsing runs column-wise through pandas."""
+    import pandas as pd  # only the batch path needs it
+    if len(tasks) != len(answers): raise ValueError("tasks and answers must have the same length")
+    if not tasks: return []
+    texts = pd.Series([a.final_answer for a in answers], dtype="object")
+    nums = texts.str.extract(NUMERIC_RE)[0].astype(float).tolist()
+    eps = texts.str.extract(EPS_RE)[0].astype(float).tolist()
+    lowers = texts.str.lower().tolist()
+    out: List[PerTaskResult] = []
+    for i, (task, answer) in enumerate(zip(tasks, answers)):
+        success = False; details: Dict[str, Any] = {}
+        exp = task.expected or {}
+        if exp.get("type") == "numeric":
+            success = _numeric(None if nums[i] != nums[i] else nums[i], exp, config, details)
+        elif exp.get("type") == "beat_miss":
+            success = _beat_miss(lowers[i], None if eps[i] != eps[i] else eps[i], exp, details)
+        score = _evidence(task, answer, 1.0 if success else 0.0, config, details)
+        out.append(PerTaskResult(task_id=task.task_id, category=task.category, success=bool(success), score=float(score), details=details, answer=answer))
+    return out
+
+def carry_run_details(new: PerTaskResult, old: PerTaskResult) -> PerTaskResult:
+    # a task that errored or timed out during the run stays a 0 whatever the rubric
+    for k in RUN_DETAILS:
+        if k in old.details: new.details[k] = old.details[k]
+    if "error" in old.details: new.success, new.score = False, 0.0
+    return new
+
+class RunStats:
+    """Incremental run-level metrics so results need not be kept in memory to summarize them (only one float per task
+    is kept, for the latency percentiles)."""
+    def __init__(self):
+        self.n = 0; self.ok = 0; self.errors = 0; self.resumed = 0; self.task_time = 0.0
+        self.by_class: Dict[str, List[int]] = {}; self.latencies = array("d")
+    def add(self, r: PerTaskResult, resumed: bool = False):
+        self.n += 1; self.ok += int(r.success); self.errors += int("error" in r.details)
+        c = self.by_class.setdefault(r.category, [0, 0]); c[0] += 1; c[1] += int(r.success)
+        if resumed: self.resumed += 1
+        elif "elapsed_sec" in r.details:
+            t = float(r.details["elapsed_sec"]); self.task_time += t; self.latencies.append(t)
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        acc = self.ok / max(1, self.n)
+        class_mean_acc = statistics.mean([ok / n for n, ok in self.by_class.values()]) if self.by_class else acc
+        p50, p95, p99 = percentiles(self.latencies)  # over tasks run (not resumed) in this run; None if there were none
+        return {"num_tasks": self.n, "accuracy": round(acc,3), "class_mean_accuracy": round(class_mean_acc,3), "time_used_sec": round(elapsed,3),
+                "task_time_sum_sec": round(self.task_time,3), "parallelism": round(self.task_time / elapsed, 2) if elapsed > 0 else 0.0,
+                "task_latency_p50_sec": p50, "task_latency_p95_sec": p95, "task_latency_p99_sec": p99,
+                "num_errors": self.errors, "num_resumed": self.resumed}
@@ -0,0 +1,36 @@
+from __future__ import annotations
+import json, os, pathlib
+from typing import Any, Dict, List, Tuple
+from common.schemas import PerTaskResult
+from green_agent.grading import RunStats
+
+# Run artifacts (per_task.jsonl checkpoints and summary.json) without the green agent's web app, so the launcher can
+# merge shard outputs without importing the server.
+AB_OUTPUT_DIR = pathlib.Path(os.getenv("AB_OUTPUT_DIR", "/outputs"))
+
+def load_checkpoint(path: pathlib.Path) -> Dict[str, PerTaskResult]:
+    done: Dict[str, PerTaskResult] = {}
+    if not path.exists(): return done
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip(): continue
+            try: r = PerTaskResult.model_validate_json(line)
+            except Exception: continue  # torn last line from an interrupted run
+            done[r.task_id] = r
+    return done
+
+def merge_outputs(shard_dirs: List[pathlib.Path], out_dir: pathlib.Path, elapsed: float, keep_results: bool = True) -> Tuple[List[PerTaskResult], Dict[str, Any]]:
+    """Concatenates per-shard per_task.jsonl files (in shard order) into out_dir and recomputes run metrics over all tasks,
+    so accuracy and class_mean_accuracy are exact rather than averages of shard averages."""
+    stats = RunStats(); per_task: List[PerTaskResult] = []; out_dir.mkdir(parents=True, exist_ok=True)
+    with (out_dir / "per_task.jsonl").open("w", encoding="utf-8") as f:
+        for d in shard_dirs:
+            for r in load_checkpoint(d / "per_task.jsonl").values():
+                stats.add(r); f.write(r.model_dump_json() + "\n")
+                if keep_results: per_task.append(r)
+    summary = stats.summary(elapsed); summary["num_shards"] = len(shard_dirs); summary["num_invalid"] = 0
+    for d in shard_dirs:  # invalid corpus rows leave no per_task record, so their count comes from the shard summaries
+        try: summary["num_invalid"] += int(json.loads((d / "summary.json").read_text(encoding="utf-8")).get("num_invalid", 0))
+        except (OSError, ValueError): pass
+    (out_dir / "summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    return per_task, summary
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import atexit, threading, time, requests
+from collections import deque
+from typing import Any, Dict, List, Optional
+from requests.adapters import HTTPAdapter
+
+# Progress webhooks are sent by one background thread so a slow or dead sink never stalls grading.
+# publish() only appends to a bounded in-memory queue. The worker drains it in batches (waiting up to linger_sec for
+# a burst to fill), drops task_started events whose task_finished is in the same batch, and POSTs one message per sink:
+# the bare event when a batch holds one, else {"event": "batch", "events": [...], "dropped": n}.
+# Under backpressure task_started is dropped first (queue half full), then task_finished (queue full); the
+# assessment_started/assessment_finished lifecycle events are always kept. A failing sink is skipped for backoff_sec.
+# With batched=False every payload is posted as is, one request each, which suits fire-and-forget calls to other APIs.
+
+CRITICAL = frozenset({"assessment_started", "assessment_finished"})
+
+def coalesce(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    finished = {e.get("task_id") for e in events if e.get("event") == "task_finished"}
+    return [e for e in events if not (e.get("event") == "task_started" and e.get("task_id") in finished)]
+
+class ProgressPublisher:
+    def __init__(self, max_queue: int = 10000, max_batch: int = 256, linger_sec: float = 0.05, timeout: float = 5.0,
+                 backoff_sec: float = 10.0, events=None, batched: bool = True):
+        self.batched = bool(batched); self.max_queue = int(max_queue); self.max_batch = int(max_batch) if batched else 1
+        self.linger_sec = float(linger_sec) if batched else 0.0
+        self.timeout = float(timeout); self.backoff_sec = float(backoff_sec); self.events = events  # optional Counter labelled by "result"
+        self._q: deque = deque(); self._cv = threading.Condition(); self._thread: Optional[threading.Thread] = None; self._busy = False
+        self._dropped: Dict[str, int] = {}; self._down_until: Dict[str, float] = {}
+        self.session = requests.Session(); adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+        self.session.mount("http://", adapter); self.session.mount("https://", adapter)
+        self.stats: Dict[str, int] = {"published": 0, "sent": 0, "messages": 0, "dropped": 0, "coalesced": 0, "failed": 0}
+
+    def _count(self, result: str, n: int = 1):
+        if n <= 0: return
+        self.stats[result] += n
+        if self.events is not None: self.events.inc(n, result=result)
+
+    def publish(self, url: str, payload: Dict[str, Any]) -> bool:
+        """Queues one event for `url`; returns False if it was dropped because the queue is saturated. Never blocks on I/O."""
+        kind = payload.get("event")
+        with self._cv:
+            n = len(self._q)
+            if kind not in CRITICAL and (n >= self.max_queue or (kind == "task_started" and n >= self.max_queue // 2)):
+                self._dropped[url] = self._dropped.get(url, 0) + 1; self._count("dropped"); return False
+            self._q.append((url, payload)); self.stats["published"] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="progress-publisher", daemon=True); self._thread.start()
+                atexit.register(self.flush, 2.0)
+            self._cv.notify_all()
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Waits until everything queued so far has been sent (or dropped); True if the queue drained in time."""
+        deadline = time.monotonic() + timeout
+        with self._cv:
+            while self._q or self._busy:
+                left = deadline - time.monotonic()
+                if left <= 0: return False
+                self._cv.wait(left)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while not self._q: self._cv.wait()
+                deadline = time.monotonic() + self.linger_sec
+                while len(self._q) < self.max_batch:
+                    left = deadline - time.monotonic()
+                    if left <= 0: break
+                    self._cv.wait(left)
+                batch = [self._q.popleft() for _ in range(min(len(self._q), self.max_batch))]
+                dropped, self._dropped = self._dropped, {}; self._busy = True
+            try:
+                groups: Dict[str, List[Dict[str, Any]]] = {}
+                for url, payload in batch: groups.setdefault(url, []).append(payload)
+                for url, events in groups.items():
+                    kept = coalesce(events); self._count("coalesced", len(events) - len(kept))
+                    self._send(url, kept, dropped.pop(url, 0))
+            finally:
+                with self._cv: self._busy = False; self._cv.notify_all()
+
+    def _send(self, url: str, events: List[Dict[str, Any]], dropped: int):
+        if time.monotonic() < self._down_until.get(url, 0.0): self._count("dropped", len(events)); return
+        body = events[0] if len(events) == 1 and (not dropped or not self.batched) else {"event": "batch", "events": events, "dropped": dropped}
+        try:
+            r = self.session.post(url, json=body, timeout=(min(2.0, self.timeout), self.timeout)); r.raise_for_status()
+            self._count("sent", len(events)); self.stats["messages"] += 1; self._down_until.pop(url, None)
+        except Exception:
+            self._count("failed", len(events)); self._down_until[url] = time.monotonic() + self.backoff_sec
+
+    def info(self) -> Dict[str, Any]:
+        with self._cv: return {**self.stats, "queued": len(self._q), "max_queue": self.max_queue}
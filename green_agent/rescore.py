@@ -0,0 +1,63 @@
+from __future__ import annotations
+import argparse, json, pathlib, sys, time
+from typing import Dict, Iterator, List
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from common.schemas import FinanceResearchTask, PerTaskResult
+from common.tasks import iter_tasks
+from green_agent.grading import GradingConfig, RunStats, carry_run_details, grade_batch
+
+# Offline re-scoring: re-grades the answers stored in an existing per_task.jsonl under a new GradingConfig,
+# without calling any agent. Writes per_task.jsonl and summary.json to --out.
+#   python -m green_agent.rescore --tasks data/tasks/sample_tasks.json --per-task outputs/per_task.jsonl --out rescored --tolerance 0.1
+
+def load_tasks(path: pathlib.Path) -> Dict[str, FinanceResearchTask]:
+    return {t.task_id: t for t in iter_tasks(path)}
+
+def iter_batches(path: pathlib.Path, size: int) -> Iterator[List[PerTaskResult]]:
+    batch: List[PerTaskResult] = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip(): continue
+            batch.append(PerTaskResult.model_validate_json(line))
+            if len(batch) >= size: yield batch; batch = []
+    if batch: yield batch
+
+def rescore(tasks: Dict[str, FinanceResearchTask], per_task: pathlib.Path, out_dir: pathlib.Path, config: GradingConfig, batch_size: int = 10000) -> Dict:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stats = RunStats(); t0 = time.time(); unmatched = changed = 0
+    with (out_dir / "per_task.jsonl").open("w", encoding="utf-8") as f:
+        for batch in iter_batches(per_task, batch_size):
+            known = [r for r in batch if r.task_id in tasks]
+            graded = iter(grade_batch([tasks[r.task_id] for r in known], [r.answer for r in known], config))
+            for old in batch:
+                if old.task_id in tasks:
+                    new = carry_run_details(next(graded), old); changed += int(new.success != old.success or new.score != old.score)
+                else:
+                    new = old; unmatched += 1  # no task definition to grade against: keep the stored result
+                stats.add(new, resumed=True); f.write(new.model_dump_json() + "\n")
+    summary = stats.summary(time.time() - t0)
+    for k in ("task_time_sum_sec", "parallelism", "num_resumed", "task_latency_p50_sec", "task_latency_p95_sec", "task_latency_p99_sec"): summary.pop(k)
+    summary.update({"num_changed": changed, "num_unmatched": unmatched, "rescored_from": str(per_task), "grading_config": config.model_dump()})
+    (out_dir / "summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    return summary
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Re-score an existing per_task.jsonl without calling any agent")
+    p.add_argument("--tasks", required=True, help="task corpus the answers were produced for (.json list or .jsonl)")
+    p.add_argument("--per-task", required=True, help="per_task.jsonl from a previous run")
+    p.add_argument("--out", required=True, help="output directory for the re-scored per_task.jsonl and summary.json")
+    p.add_argument("--config", default=None, help="JSON file with GradingConfig fields")
+    p.add_argument("--tolerance", type=float, default=None, help="override numeric tolerance (USD billions)")
+    p.add_argument("--missing-sources-penalty", type=float, default=None)
+    p.add_argument("--disallowed-domains-penalty", type=float, default=None)
+    p.add_argument("--batch-size", type=int, default=10000)
+    args = p.parse_args(argv)
+    cfg = json.loads(pathlib.Path(args.config).read_text(encoding="utf-8")) if args.config else {}
+    for k in ("tolerance", "missing_sources_penalty", "disallowed_domains_penalty"):
+        if getattr(args, k) is not None: cfg[k] = getattr(args, k)
+    summary = rescore(load_tasks(pathlib.Path(args.tasks)), pathlib.Path(args.per_task), pathlib.Path(args.out), GradingConfig.model_validate(cfg), args.batch_size)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
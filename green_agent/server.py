@@ -1,32 +1,66 @@
 from __future__ import annotations
-import os, time, json, requests, statistics, pathlib
-from typing import Any, Dict, List, Optional
-from fastapi import FastAPI, Body
-from pydantic import BaseModel
-from common.schemas import FinanceResearchTask, AnswerSchema, PerTaskResult, AssessmentResult
+import os, time, json, requests, pathlib
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from fastapi import FastAPI, Body, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, model_validator
+from common.schemas import FinanceResearchTask, AnswerSchema, PerTaskResult, AssessmentResult, TaskSource
+from common.tasks import TaskCorpusError, iter_source
+from green_agent.grading import RunStats, grade
+from green_agent.outputs import AB_OUTPUT_DIR, load_checkpoint
+from green_agent.progress import ProgressPublisher
+from common.metrics import Registry, instrument
 
 app = FastAPI(title="Finance Green Agent (Evaluator)")
 STATE: Dict[str, Any] = {"runs": 0}
-AB_OUTPUT_DIR = pathlib.Path(os.getenv("AB_OUTPUT_DIR", "/outputs"))
+TASKS_ROOT = pathlib.Path(os.getenv("GREEN_TASKS_ROOT", str(pathlib.Path(__file__).resolve().parents[1] / "data" / "tasks")))
+MAX_CONCURRENCY = 256  # dispatch keeps 4x this many tasks in flight, so it bounds both threads and memory
+METRICS = Registry()
+PARTICIPANT_SECONDS = METRICS.histogram("green_participant_duration_seconds", "Participant /task latency per task", ("category", "outcome"))
+PARTICIPANT_BYTES = METRICS.counter("green_participant_response_bytes_total", "Answer bytes received from the participant")
+GRADE_SECONDS = METRICS.histogram("green_grade_duration_seconds", "Time to grade one answer")
+TASKS_TOTAL = METRICS.counter("green_tasks_total", "Graded tasks by result (success, failure, error) and category", ("category", "result"))
+instrument(app, METRICS, "green")
+PROGRESS = ProgressPublisher(max_queue=int(os.getenv("GREEN_PROGRESS_QUEUE", "10000")), linger_sec=float(os.getenv("GREEN_PROGRESS_LINGER_SEC", "0.05")),
+                             events=METRICS.counter("green_progress_events_total", "Progress events by result (sent, dropped, coalesced, failed)", ("result",)))
+RELEASES = ProgressPublisher(batched=False, backoff_sec=1.0,
+                             events=METRICS.counter("green_kv_releases_total", "kv_release calls to the tools hub by result (sent, dropped, failed)", ("result",)))
 
 class AssessRequest(BaseModel):
     purple_agent_url: Optional[str] = None
     white_agent_url: Optional[str] = None  # backwards compatibility
-    tasks: List[FinanceResearchTask]
+    tasks: Optional[List[FinanceResearchTask]] = None
+    task_source: Optional[TaskSource] = None  # stream tasks from a corpus under $GREEN_TASKS_ROOT instead of inline
     tools_base_url: Optional[str] = None
     progress_url: Optional[str] = None
+    max_concurrency: int = Field(default_factory=lambda: int(os.getenv("GREEN_MAX_CONCURRENCY", "4")), ge=1, le=MAX_CONCURRENCY)
+    resume: bool = False  # skip task_ids already graded in the output dir's per_task.jsonl
+    output_subdir: Optional[str] = Field(default=None, pattern=r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")  # artifacts go to $AB_OUTPUT_DIR/<output_subdir>
+
+    @model_validator(mode="after")
+    def _one_task_input(self):
+        if (self.tasks is None) == (self.task_source is None): raise ValueError("provide exactly one of tasks or task_source")
+        return self
 
     @property
     def participant_url(self):
         return self.purple_agent_url or self.white_agent_url
 
+    @property
+    def output_dir(self) -> pathlib.Path:
+        return AB_OUTPUT_DIR / self.output_subdir if self.output_subdir else AB_OUTPUT_DIR
+
+    def iter_tasks(self, on_invalid=None) -> Iterable[FinanceResearchTask]:
+        return self.tasks if self.tasks is not None else iter_source(self.task_source, TASKS_ROOT, on_invalid)
+
 @app.get("/agent_card")
 def agent_card():
     return {
         "name": "FinanceGreenAgent",
         "protocol": "a2a-lite-0.2",
-        "endpoints": {"reset": "/reset", "assess": "/assess"},
-        "capabilities": {"progress_updates": True, "artifacts": True}
+        "endpoints": {"reset": "/reset", "assess": "/assess", "assess_stream": "/assess/stream"},
+        "capabilities": {"progress_updates": True, "artifacts": True, "streaming": True, "resume": True}
     }
 
 @app.post("/reset")
@@ -37,108 +71,139 @@ def reset():
 def fetch_tools_spec(base_url: str) -> Dict[str, Any]:
     r = requests.get(f"{base_url}/tools", timeout=15); r.raise_for_status(); return r.json()
 
-def call_participant(participant_url: str, task: Dict[str, Any], tools_spec: Dict[str, Any]) -> AnswerSchema:
+def call_participant(participant_url: str, task: Dict[str, Any], tools_spec: Dict[str, Any], timeout: float = 600) -> AnswerSchema:
     payload = {"task": task, "tools_spec": tools_spec}
-    r = requests.post(f"{participant_url}/task", json=payload, timeout=600)
-    r.raise_for_status()
+    r = requests.post(f"{participant_url}/task", json=payload, timeout=(min(10.0, timeout), timeout))
+    r.raise_for_status(); PARTICIPANT_BYTES.inc(len(r.content))
     return AnswerSchema.model_validate(r.json())
 
 def _post_progress(url: Optional[str], payload: Dict[str, Any]):
-    if not url: return
-    try: requests.post(url, json=payload, timeout=5)
-    except Exception: pass
-
-def grade(task: FinanceResearchTask, answer: AnswerSchema) -> PerTaskResult:
-    success = False; score = 0.0; details: Dict[str, Any] = {}
-    exp = task.expected or {}
-
-    # numeric
-    if exp.get("type") == "numeric":
-        import re
-        tol = float(exp.get("tolerance", 0.5))
-        m = re.search(r"([\d]+(\.\d+)?)\s*(?:USD\s*)?billions?", answer.final_answer, flags=re.I)
-        val = float(m.group(1)) if m else None
-        details["parsed_value_bil"] = val; details["expected_value_bil"] = exp.get("value")
-        if val is not None and abs(val - float(exp.get("value"))) <= tol:
-            success, score = True, 1.0
-
-    # beat/miss with EPS direction
-    elif exp.get("type") == "beat_miss":
-        want = (exp.get("result") or "").lower()  # "beat" or "miss"
-        text = answer.final_answer.lower()
-        classified = "beat" if "beat" in text else ("miss" if "miss" in text else "unknown")
-        details["classified"] = classified
-        ok_cls = (classified == want)
-
-        import re
-        eps = None
-        m = re.search(r"eps[^$]*\$(\d+(\.\d+)?)", answer.final_answer, flags=re.I)
-        if m: eps = float(m.group(1))
-        consensus = exp.get("consensus")
-        direction_ok = None
-        if eps is not None and isinstance(consensus, (int, float)):
-            direction_ok = ((eps - float(consensus)) > 0) == (want == "beat")
-        details.update({"eps": eps, "consensus": consensus, "direction_ok": direction_ok})
-
-        success = bool(ok_cls and (direction_ok is not False))
-        score = 1.0 if success else 0.0
-
-    # evidence & domain policy
-    must_cite = bool(getattr(task.evidence_policy, "must_cite", True))
-    allowed = set((getattr(task.evidence_policy, "allowed_domains", None) or []))
-    urls = [s.url for s in (answer.sources or []) if getattr(s, "url", None)]
-
-    if must_cite and not urls:
-        score *= 0.5
-        details["penalty_missing_sources"] = True
-
-    if allowed and urls:
-        def _in_allowed(u: str) -> bool: return any(dom in u for dom in allowed)
-        bad = [u for u in urls if not _in_allowed(u)]
-        if bad:
-            score *= 0.5
-            details["penalty_disallowed_domains"] = bad
-
-    return PerTaskResult(task_id=task.task_id, category=task.category, success=bool(success), score=float(score), details=details, answer=answer)
-
-@app.post("/assess")
-def assess(req: AssessRequest = Body(...)) -> AssessmentResult:
-    STATE["runs"] += 1
+    if url: PROGRESS.publish(url, payload)
+
+def release_context(tools_base_url: Optional[str], context_id: str):
+    # best effort, off the worker thread: frees the task's scratch KV state on the tools hub (contexts are keyed by task_id;
+    # one that is never released still expires after TOOLS_KV_TTL_SEC)
+    if tools_base_url: RELEASES.publish(f"{tools_base_url}/call", {"tool": "kv_release", "context_id": context_id})
+
+def run_task(participant_url: str, task: FinanceResearchTask, tools_spec: Dict[str, Any], progress_url: Optional[str] = None) -> PerTaskResult:
+    # the task's time budget bounds the participant call; an overrun or a failed call grades as 0 instead of aborting the run
+    _post_progress(progress_url, {"event": "task_started", "task_id": task.task_id})
+    budget = float(task.constraints.time_budget_sec); err = None; outcome = "ok"; t0 = time.perf_counter()
+    try: ans = call_participant(participant_url, task.model_dump(), tools_spec, timeout=budget)
+    except requests.Timeout: ans = AnswerSchema(final_answer=""); err = f"time budget exceeded ({budget:g}s)"; outcome = "timeout"
+    except Exception as e: ans = AnswerSchema(final_answer=""); err = f"{type(e).__name__}: {e}"; outcome = "error"
+    t1 = time.perf_counter(); PARTICIPANT_SECONDS.observe(t1 - t0, category=task.category, outcome=outcome)
+    release_context(tools_spec.get("base_url"), task.task_id)
+    res = grade(task, ans); GRADE_SECONDS.observe(time.perf_counter() - t1)
+    if err: res.success, res.score = False, 0.0; res.details["error"] = err
+    res.details["elapsed_sec"] = round(time.perf_counter() - t0, 3)
+    TASKS_TOTAL.inc(category=task.category, result="error" if err else ("success" if res.success else "failure"))
+    return res
+
+def dispatch(tasks: Iterable[FinanceResearchTask], participant_url: str, tools_spec: Dict[str, Any], max_concurrency: int = 1,
+             progress_url: Optional[str] = None, done: Optional[Dict[str, PerTaskResult]] = None) -> Iterator[Tuple[int, PerTaskResult]]:
+    # bounded thread pool; at most 4x max_concurrency tasks are in flight and (input index, result) pairs are yielded as
+    # tasks complete, so one slow task holds back neither the results behind it nor the idle workers.
+    # tasks already present in `done` (a resumed checkpoint) are passed through without calling the participant.
+    max_concurrency = max(1, min(max_concurrency, MAX_CONCURRENCY))
+    window = max_concurrency * 4; pending: Dict[Future, int] = {}; done = done or {}
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="assess") as pool:
+        def drain(full: bool) -> Iterator[Tuple[int, PerTaskResult]]:
+            while len(pending) >= (window if full else 1):
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for f in finished: yield pending.pop(f), f.result()
+        for i, t in enumerate(tasks):
+            if t.task_id in done: yield i, done[t.task_id]; continue
+            pending[pool.submit(run_task, participant_url, t, tools_spec, progress_url)] = i
+            yield from drain(full=True)
+        yield from drain(full=False)
+
+def _open_checkpoint(out_dir: pathlib.Path, resume: bool):
+    # per_task.jsonl is appended and flushed after every graded task; on resume it is first rewritten with the records that
+    # completed, so tasks lost to a participant error or timeout (details.error) are run again rather than carried over
+    path = out_dir / "per_task.jsonl"
+    done = {k: r for k, r in load_checkpoint(path).items() if not r.details.get("error")} if resume else {}
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if resume:
+        tmp = path.with_suffix(".jsonl.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for pt in done.values(): f.write(pt.model_dump_json() + "\n")
+        os.replace(tmp, path)
+    return done, path.open("a" if resume else "w", encoding="utf-8")
+
+def iter_assessment(req: AssessRequest) -> Iterator[Any]:
+    """Opens the task corpus, fetches the tools spec and opens the checkpoint right away, so a missing or undecodable corpus
+    or an unreachable tools hub is an HTTP error rather than a broken stream, then returns an iterator yielding (input
+    index, PerTaskResult) as soon as each task is graded (in completion order) and finally the summary dict."""
+    invalid: List[str] = []
+    def on_invalid(e: TaskCorpusError):
+        # a malformed corpus row is skipped and counted rather than aborting the run (and every later resume) at that line
+        invalid.append(str(e)); _post_progress(req.progress_url, {"event": "task_invalid", "error": str(e)})
+    try: tasks = req.iter_tasks(on_invalid)
+    except (TaskCorpusError, json.JSONDecodeError) as e: raise HTTPException(400, str(e))
     tools_base_url = req.tools_base_url or os.environ.get("TOOLS_BASE_URL")
-    if not tools_base_url: raise RuntimeError("tools_base_url not provided and TOOLS_BASE_URL env is empty")
-    participant = req.participant_url
-    if not participant: raise RuntimeError("participant (purple) agent URL is required")
-
-    tools_spec = fetch_tools_spec(tools_base_url)
-    per_task: List[PerTaskResult] = []; t0 = time.time()
-
-    _post_progress(req.progress_url, {"event": "assessment_started", "num_tasks": len(req.tasks)})
-    for t in req.tasks:
-        _post_progress(req.progress_url, {"event": "task_started", "task_id": t.task_id})
-        ans = call_participant(participant, t.model_dump(), tools_spec)
-        res = grade(t, ans); per_task.append(res)
-        _post_progress(req.progress_url, {"event": "task_finished", "task_id": t.task_id, "success": res.success, "score": res.score})
-    elapsed = time.time() - t0
-
-    acc = sum(1 for r in per_task if r.success) / max(1, len(per_task))
-    class_means: Dict[str, List[float]] = {}
-    for r in per_task: class_means.setdefault(r.category, []).append(1.0 if r.success else 0.0)
-    class_mean_acc = statistics.mean([sum(v)/len(v) for v in class_means.values()]) if class_means else acc
-
-    summary = {"num_tasks": len(per_task), "accuracy": round(acc,3), "class_mean_accuracy": round(class_mean_acc,3), "time_used_sec": round(elapsed,3), "tool_server": tools_base_url}
-
-    # artifacts
+    try: tools_spec = fetch_tools_spec(tools_base_url)
+    except requests.RequestException as e: raise HTTPException(502, f"tools hub {tools_base_url} unavailable: {e}")
+    artifact_err = None; out = None; done: Dict[str, PerTaskResult] = {}
+    try: done, out = _open_checkpoint(req.output_dir, req.resume)
+    except Exception as e: artifact_err = str(e)
+    return _run_assessment(req, tasks, invalid, tools_base_url, tools_spec, done, out, artifact_err)
+
+def _run_assessment(req: AssessRequest, tasks: Iterable[FinanceResearchTask], invalid: List[str], tools_base_url: str, tools_spec: Dict[str, Any],
+                    done: Dict[str, PerTaskResult], out, artifact_err: Optional[str]) -> Iterator[Any]:
+    participant = req.participant_url; stats = RunStats(); t0 = time.time()
+    _post_progress(req.progress_url, {"event": "assessment_started", "num_tasks": len(req.tasks) if req.tasks is not None else None})
+    try:
+        for i, res in dispatch(tasks, participant, tools_spec, req.max_concurrency, req.progress_url, done):
+            resumed = done.get(res.task_id) is res; stats.add(res, resumed)
+            if not resumed:
+                if out is not None:
+                    try: out.write(res.model_dump_json() + "\n"); out.flush()
+                    except Exception as e: artifact_err = str(e)
+                _post_progress(req.progress_url, {"event": "task_finished", "task_id": res.task_id, "success": res.success, "score": res.score})
+            yield i, res
+    finally:
+        if out is not None: out.close()
+
+    summary = stats.summary(time.time() - t0)
+    summary.update({"max_concurrency": req.max_concurrency, "tool_server": tools_base_url, "num_invalid": len(invalid)})
+    if invalid: summary["invalid_tasks"] = invalid[:20]
+    if req.task_source is not None: summary["task_source"] = req.task_source.model_dump()
     try:
-        AB_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        (AB_OUTPUT_DIR / "summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
-        with (AB_OUTPUT_DIR / "per_task.jsonl").open("w", encoding="utf-8") as f:
-            for pt in per_task: f.write(pt.model_dump_json() + "\n")
+        if artifact_err is None:
+            (req.output_dir / "summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
     except Exception as e:
-        summary["artifact_write_error"] = str(e)
+        artifact_err = str(e)
+    if artifact_err is not None: summary["artifact_write_error"] = artifact_err
 
     _post_progress(req.progress_url, {"event": "assessment_finished", "summary": summary})
+    yield summary
 
-    return AssessmentResult(purple_agent_url=participant, per_task=per_task, summary=summary)
+def _check_request(req: AssessRequest):
+    STATE["runs"] += 1
+    if not (req.tools_base_url or os.environ.get("TOOLS_BASE_URL")): raise RuntimeError("tools_base_url not provided and TOOLS_BASE_URL env is empty")
+    if not req.participant_url: raise RuntimeError("participant (purple) agent URL is required")
+
+@app.post("/assess")
+def assess(req: AssessRequest = Body(...)) -> AssessmentResult:
+    _check_request(req)
+    per_task: List[Tuple[int, PerTaskResult]] = []; summary: Dict[str, Any] = {}
+    for item in iter_assessment(req):
+        if isinstance(item, tuple): per_task.append(item)
+        else: summary = item
+    per_task.sort(key=lambda x: x[0])  # checkpoint and stream are in completion order; the response keeps task order
+    return AssessmentResult(purple_agent_url=req.participant_url, per_task=[r for _, r in per_task], summary=summary)
+
+@app.post("/assess/stream")
+def assess_stream(req: AssessRequest = Body(...)):
+    """NDJSON variant of /assess: one {"event": "task_result"} line per graded task in completion order, then one
+    {"event": "summary"} line."""
+    _check_request(req); items = iter_assessment(req)
+    def lines() -> Iterator[str]:
+        for item in items:
+            if isinstance(item, tuple): yield json.dumps({"event": "task_result", "result": item[1].model_dump(mode="json")}, ensure_ascii=False) + "\n"
+            else: yield json.dumps({"event": "summary", "purple_agent_url": req.participant_url, "summary": item}, ensure_ascii=False) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 def create_app(): return app
 
@@ -1,61 +1,206 @@
 from __future__ import annotations
 import multiprocessing as mp
-import os, time, json, requests, pathlib, sys
-from typing import Any, Dict, List
-import uvicorn
+import importlib, os, threading, time, json, requests, pathlib, sys
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Optional
 sys.path.append(str(pathlib.Path(__file__).parent))
+from green_agent.outputs import AB_OUTPUT_DIR, merge_outputs
+from tools.http_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB
 
-from tools.server import create_app as create_tools_app
-from green_agent.server import create_app as create_green_app
-from purple_agent.server import create_app as create_purple_app
-from common.schemas import FinanceResearchTask
-
+# Service apps are named as "module:factory" and imported only where they run: spawned children re-import this module,
+# so importing every app here would make each process load all three stacks.
+TOOLS_APP = "tools.server:create_app"; GREEN_APP = "green_agent.server:create_app"; PURPLE_APP = "purple_agent.server:create_app"
 HOST = "127.0.0.1"; PORT_TOOLS = 7001; PORT_GREEN = 7002; PORT_PURPLE = 7003
+STARTUP_SEC: Dict[str, float] = {}  # seconds from start_services() until each service (and "total") was accepting connections
+
+def load_app(factory):
+    if isinstance(factory, str):
+        module, _, name = factory.partition(":"); factory = getattr(importlib.import_module(module), name)
+    return factory()
+
+def _server(app, host: str, port: int, on_ready):
+    import uvicorn
+    class Server(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets)
+            if self.started: on_ready()  # the socket is bound and listening: no readiness polling needed
+    return Server(uvicorn.Config(app=app, host=host, port=port, log_level="info", workers=1))
+
+def run_uvicorn(app_factory, host: str, port: int, env: Optional[Dict[str, str]] = None, ready=None):
+    os.environ.update(env or {})
+    _server(load_app(app_factory), host, port, lambda: ready is not None and ready.send(True)).run()
+
+def wait_ready(services: Dict[str, Any], timeout_s: float = 60, t0: Optional[float] = None):
+    """Blocks until every (process, pipe) in services has reported that its server is listening; raises if one exits first."""
+    t0 = time.perf_counter() if t0 is None else t0; deadline = t0 + timeout_s
+    pending = {conn: (name, proc) for name, (proc, conn) in services.items()}
+    while pending:
+        left = deadline - time.perf_counter()
+        if left <= 0: raise RuntimeError(f"Service(s) not ready after {timeout_s:g}s: {', '.join(n for n, _ in pending.values())}")
+        # a child that dies closes its end of the pipe, so recv() raising EOFError is the "exited during startup" event
+        for conn in wait(list(pending), timeout=left):
+            name, proc = pending.pop(conn)
+            try: conn.recv()
+            except EOFError:
+                proc.join(1); raise RuntimeError(f"Service {name} exited during startup (exit code {proc.exitcode})") from None
+            STARTUP_SEC[name] = round(time.perf_counter() - t0, 3)
+
+def tools_worker_env(i: int, n_tools: int, port: int) -> Dict[str, str]:
+    # HttpCache keeps its LRU index and byte total per process, so workers sharing a directory would each count only their
+    # own files and evict the others'; each worker gets its own subdirectory and an equal share of TOOLS_CACHE_MAX_MB
+    env = {"TOOLS_BASE_URL": f"http://{HOST}:{port}"}
+    if n_tools > 1:
+        env["TOOLS_CACHE_DIR"] = os.path.join(os.getenv("TOOLS_CACHE_DIR", DEFAULT_CACHE_DIR), f"tools-{i}")
+        env["TOOLS_CACHE_MAX_MB"] = repr(float(os.getenv("TOOLS_CACHE_MAX_MB", str(DEFAULT_CACHE_MAX_MB))) / n_tools)
+    return env
+
+def start_services(n_purple: int = 1, n_tools: int = 1, port_base: int = PORT_TOOLS):
+    """Ports: tools hubs first, then one green agent per purple replica, then the purple replicas.
+    With one of each this is the classic 7001/7002/7003 layout. All processes start at once (the agents only reach the
+    tools hub per request) and each reports readiness over a pipe once its socket is listening."""
+    t0 = time.perf_counter(); STARTUP_SEC.clear()
+    tools_ports = [port_base + i for i in range(n_tools)]
+    green_ports = [port_base + n_tools + i for i in range(n_purple)]
+    purple_ports = [port_base + n_tools + n_purple + i for i in range(n_purple)]
+    os.environ.setdefault("TOOLS_BASE_URL", f"http://{HOST}:{tools_ports[0]}")
+    specs = [(f"tools-{i}", TOOLS_APP, port, tools_worker_env(i, n_tools, port)) for i, port in enumerate(tools_ports)] + \
+            [(f"green-{i}", GREEN_APP, port, None) for i, port in enumerate(green_ports)] + [(f"purple-{i}", PURPLE_APP, port, None) for i, port in enumerate(purple_ports)]
+    procs: List[mp.Process] = []; services: Dict[str, Any] = {}
+    for name, factory, port, env in specs:
+        recv, send = mp.Pipe(duplex=False)
+        p = mp.Process(target=run_uvicorn, args=(factory, HOST, port, env, send), name=name, daemon=True); p.start(); send.close()
+        procs.append(p); services[name] = (p, recv)
+    try: wait_ready(services, t0=t0)
+    except BaseException: stop_services(procs); raise
+    STARTUP_SEC["total"] = round(time.perf_counter() - t0, 3)
+    urls = {k: [f"http://{HOST}:{p}" for p in ports] for k, ports in (("tools", tools_ports), ("green", green_ports), ("purple", purple_ports))}
+    return procs, urls
+
+def stop_services(procs: List[Any]):
+    for p in reversed(procs):
+        if p.is_alive(): p.terminate(); p.join(timeout=3)
 
-def run_uvicorn(app_factory, host: str, port: int):
-    app = app_factory()
-    config = uvicorn.Config(app=app, host=host, port=port, log_level="info", workers=1)
-    server = uvicorn.Server(config); server.run()
+# --- in-process mode: one uvicorn server in a thread of this process, with the green agent mounted under /green, the
+# purple agent under /purple and the tools hub at the root (so task context URLs like /static/... keep working).
+# Each stack is imported once and no child interpreters are started, which is what dominates short runs.
+class InProcessServer:
+    def __init__(self, server, done: threading.Event):
+        def run():
+            try: server.run()
+            finally: done.set()  # also wakes start_inprocess() when the server fails to start (e.g. port in use)
+        self.server = server; self.thread = threading.Thread(target=run, name="inprocess-server", daemon=True)
+    @property
+    def pid(self): return os.getpid()
+    def is_alive(self): return self.thread.is_alive()
+    def terminate(self): self.server.should_exit = True
+    def join(self, timeout=None): self.thread.join(timeout)
 
-def wait_ready(url: str, path: str, timeout_s: int = 20):
+def create_inprocess_app(threads: int = 40):
+    import anyio.to_thread
+    from contextlib import asynccontextmanager
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+    @asynccontextmanager
+    async def lifespan(_):
+        # green -> purple -> tools requests nest inside one process, and every sync endpoint holds a worker thread
+        limiter = anyio.to_thread.current_default_thread_limiter(); limiter.total_tokens = max(limiter.total_tokens, threads); yield
+    return Starlette(routes=[Mount("/green", app=load_app(GREEN_APP)), Mount("/purple", app=load_app(PURPLE_APP)), Mount("/", app=load_app(TOOLS_APP))],
+                     lifespan=lifespan)
+
+def start_inprocess(port: int = PORT_TOOLS, max_concurrency: int = 4, timeout_s: float = 60):
+    t0 = time.perf_counter(); STARTUP_SEC.clear()
+    base = f"http://{HOST}:{port}"; os.environ["TOOLS_BASE_URL"] = base
+    ready = threading.Event(); server = _server(create_inprocess_app(8 * max_concurrency + 8), HOST, port, ready.set)
+    proc = InProcessServer(server, ready); proc.thread.start()
+    if not ready.wait(timeout_s) or not server.started:
+        proc.terminate(); raise RuntimeError(f"In-process server failed to start on {base}")
+    STARTUP_SEC["inprocess"] = STARTUP_SEC["total"] = round(time.perf_counter() - t0, 3)
+    return [proc], {"tools": [base], "green": [f"{base}/green"], "purple": [f"{base}/purple"]}
+
+# --- sharded mode: a process pool where each worker owns one lane (green_i, purple_i, tools_{i % M}) and pulls
+# shard ids from a shared queue, so a lane that finishes early simply takes the next shard (work stealing).
+_LANE: Dict[str, str] = {}
+
+def _init_lane(lanes: "mp.Queue"):
+    _LANE.update(lanes.get())
+
+def _run_shard(job: Dict[str, Any]) -> Dict[str, Any]:
+    body = {"purple_agent_url": _LANE["purple"], "tools_base_url": _LANE["tools"], "task_source": {**job["task_source"], "shard_index": job["shard"]},
+            "max_concurrency": job["max_concurrency"], "resume": job["resume"], "output_subdir": f"shard-{job['shard']:04d}"}
+    r = requests.post(f"{_LANE['green']}/assess/stream", json=body, timeout=(10, job["timeout"]), stream=True); r.raise_for_status()
+    summary: Dict[str, Any] = {}
+    for line in r.iter_lines():  # streamed so the pool never holds a shard's full result payload
+        if line:
+            ev = json.loads(line)
+            if ev.get("event") == "summary": summary = ev["summary"]
+    return {"shard": job["shard"], "lane": _LANE["green"], "summary": summary}
+
+def run_sharded(urls: Dict[str, List[str]], task_source: Dict[str, Any], shards: int, max_concurrency: int, resume: bool, timeout: Optional[float],
+                keep_results: bool = True, verbose: bool = True):
+    lanes = [{"green": g, "purple": p, "tools": urls["tools"][i % len(urls["tools"])]} for i, (g, p) in enumerate(zip(urls["green"], urls["purple"]))]
+    q: "mp.Queue" = mp.Queue()
+    for lane in lanes: q.put(lane)
+    jobs = [{"shard": k, "task_source": {**task_source, "shard_count": shards}, "max_concurrency": max_concurrency, "resume": resume, "timeout": timeout}
+            for k in range(shards)]
     t0 = time.time()
-    while time.time() - t0 < timeout_s:
-        try:
-            r = requests.get(f"{url}{path}", timeout=2)
-            if r.status_code == 200: return True
-        except Exception: pass
-        time.sleep(0.2)
-    raise RuntimeError(f"Service not ready: {url}{path}")
-
-def main():
-    print("Starting tool server, green agent, and purple agent...")
-    p_tools = mp.Process(target=run_uvicorn, args=(create_tools_app, HOST, PORT_TOOLS), daemon=True)
-    p_green = mp.Process(target=run_uvicorn, args=(create_green_app, HOST, PORT_GREEN), daemon=True)
-    p_purple = mp.Process(target=run_uvicorn, args=(create_purple_app, HOST, PORT_PURPLE), daemon=True)
-
-    p_tools.start(); os.environ.setdefault("TOOLS_BASE_URL", f"http://{HOST}:{PORT_TOOLS}"); time.sleep(0.5)
-    p_green.start(); time.sleep(0.2)
-    p_purple.start()
-
-    tools_url = f"http://{HOST}:{PORT_TOOLS}"
-    green_url = f"http://{HOST}:{PORT_GREEN}"
-    purple_url = f"http://{HOST}:{PORT_PURPLE}"
-    try:
-        wait_ready(tools_url, "/tools"); wait_ready(green_url, "/agent_card"); wait_ready(purple_url, "/agent_card")
-        print("All services are live. Resetting agents...")
-        requests.post(f"{green_url}/reset", timeout=5); requests.post(f"{purple_url}/reset", timeout=5)
+    with mp.Pool(processes=len(lanes), initializer=_init_lane, initargs=(q,)) as pool:
+        for done in pool.imap_unordered(_run_shard, jobs, chunksize=1):
+            s = done["summary"]
+            if verbose: print(f"  shard {done['shard']:>4} on {done['lane']}: {s.get('num_tasks')} tasks, accuracy={s.get('accuracy')}, {s.get('time_used_sec')}s")
+    elapsed = time.time() - t0
+    per_task, summary = merge_outputs([AB_OUTPUT_DIR / f"shard-{k:04d}" for k in range(shards)], AB_OUTPUT_DIR, elapsed, keep_results)
+    summary.update({"purple_replicas": len(urls["purple"]), "tools_workers": len(urls["tools"]), "max_concurrency": max_concurrency,
+                    "tasks_per_sec": round(summary["num_tasks"] / elapsed, 2) if elapsed > 0 else 0.0})
+    (AB_OUTPUT_DIR / "summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    return {"purple_agent_url": ",".join(urls["purple"]), "per_task": [r.model_dump(mode="json") for r in per_task], "summary": summary}
 
-        tasks_path = pathlib.Path(__file__).parent / "data" / "tasks" / "sample_tasks.json"
-        tasks_json = json.loads(tasks_path.read_text(encoding="utf-8"))
-        tasks = [FinanceResearchTask.model_validate(t) for t in tasks_json]
-        print(f"Loaded {len(tasks)} tasks. Launching assessment...")
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tasks", default=str(pathlib.Path(__file__).parent / "data" / "tasks" / "sample_tasks.json"), help="task corpus (.jsonl, or a .json list)")
+    ap.add_argument("--categories", nargs="*", default=None, help="only run tasks of these categories")
+    ap.add_argument("--limit", type=int, default=None, help="max tasks (per shard in sharded mode)")
+    ap.add_argument("--purple-replicas", type=int, default=1, help="purple agents (each paired with its own green agent)")
+    ap.add_argument("--tools-workers", type=int, default=1, help="tool hub processes; lanes are spread over them round-robin")
+    ap.add_argument("--shards", type=int, default=None, help="corpus shards; defaults to 1, or 4 per purple replica when there are several")
+    ap.add_argument("--max-concurrency", type=int, default=int(os.getenv("GREEN_MAX_CONCURRENCY", "4")), help="in-flight tasks per shard")
+    ap.add_argument("--port-base", type=int, default=PORT_TOOLS)
+    ap.add_argument("--resume", action="store_true", help="skip tasks already graded in the output dir(s)")
+    ap.add_argument("--timeout", type=float, default=600, help="seconds to wait for one /assess (or one shard)")
+    ap.add_argument("--in-process", action="store_true", help="serve tools, green and purple from one server in this process (one lane; fastest startup)")
+    args = ap.parse_args(argv)
+    shards = args.shards or (1 if args.purple_replicas == 1 else 4 * args.purple_replicas)
+    # the green agent streams the corpus itself; it only receives a reference relative to GREEN_TASKS_ROOT
+    tasks_path = pathlib.Path(args.tasks).resolve()
+    os.environ["GREEN_TASKS_ROOT"] = str(tasks_path.parent)
+
+    if args.in_process:
+        if args.purple_replicas != 1 or args.tools_workers != 1: ap.error("--in-process runs a single lane; drop --purple-replicas/--tools-workers")
+        print(f"Starting tools, green and purple in-process on port {args.port_base}...")
+        procs, urls = start_inprocess(args.port_base, args.max_concurrency)
+    else:
+        print(f"Starting {args.tools_workers} tool server(s), {args.purple_replicas} green agent(s) and {args.purple_replicas} purple agent(s)...")
+        procs, urls = start_services(args.purple_replicas, args.tools_workers, args.port_base)
+    try:
+        print(f"All services are live after {STARTUP_SEC['total']:.2f}s. Resetting agents...")
+        for u in urls["green"] + urls["purple"]: requests.post(f"{u}/reset", timeout=5)
 
-        assess_req = {"purple_agent_url": purple_url, "tasks": [t.model_dump() for t in tasks], "tools_base_url": tools_url}
-        r = requests.post(f"{green_url}/assess", json=assess_req, timeout=600); r.raise_for_status()
-        result = r.json()
+        task_source = {"path": tasks_path.name, "categories": args.categories, "limit": args.limit}
+        print(f"Launching assessment over {tasks_path} ({shards} shard(s))...")
+        if shards == 1:
+            assess_req = {"purple_agent_url": urls["purple"][0], "task_source": task_source, "tools_base_url": urls["tools"][0],
+                          "max_concurrency": args.max_concurrency, "resume": args.resume}
+            r = requests.post(f"{urls['green'][0]}/assess", json=assess_req, timeout=args.timeout); r.raise_for_status()
+            result = r.json()
+        else:
+            result = run_sharded(urls, task_source, shards, args.max_concurrency, args.resume, args.timeout)
+        result["summary"]["startup_sec"] = dict(STARTUP_SEC)
 
         print("\n=== Assessment Result ===")
         print(json.dumps(result["summary"], indent=2, ensure_ascii=False))
+        if len(result["per_task"]) > 50:
+            print(f"\n{len(result['per_task'])} per-task results written to {AB_OUTPUT_DIR / 'per_task.jsonl'}")
+            return
         print("\nPer-task:")
         for pt in result["per_task"]:
             print(f"- {pt['task_id']} | success={pt['success']} | score={pt['score']}")
@@ -65,8 +210,7 @@ def main():
             print()
     finally:
         print("Terminating services...")
-        for p in (p_purple, p_green, p_tools):
-            if p.is_alive(): p.terminate(); p.join(timeout=3)
+        stop_services(procs)
 
 if __name__ == "__main__":
     mp.set_start_method("spawn", force=True); main()
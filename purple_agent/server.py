@@ -1,12 +1,30 @@
 from __future__ import annotations
-import re, requests
-from typing import Any, Dict, List, Optional
-from fastapi import FastAPI, Body
+import os, re, time, requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import FastAPI, Body, HTTPException
 from pydantic import BaseModel
 from common.schemas import FinanceResearchTask, AnswerSchema, SourceItem, ToolStats
+from common.metrics import Registry, instrument
 
 app = FastAPI(title="Generic Purple Agent")
 STATE: Dict[str, Any] = {"sessions": {}}
+METRICS = Registry()
+TOOL_RTT = METRICS.histogram("purple_tool_request_duration_seconds", "Round-trip time of requests to the tools hub", ("endpoint", "tool"))
+TOOL_BYTES = METRICS.counter("purple_tool_response_bytes_total", "Response bytes received from the tools hub", ("endpoint",))
+TASK_SECONDS = METRICS.histogram("purple_task_duration_seconds", "Time to solve one task", ("category",))
+instrument(app, METRICS, "purple")
+
+def _make_session() -> requests.Session:
+    s = requests.Session(); adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    s.mount("http://", adapter); s.mount("https://", adapter); return s
+
+SESSION = _make_session()  # keep-alive connections to the tools hub, shared across concurrent tasks
+FETCH_PARALLEL = int(os.getenv("PURPLE_FETCH_PARALLEL", "8"))  # context documents fetched/parsed at once per task
+# one pass over the page text for beat/miss tasks: the words "beat"/"miss" anywhere, and the first "EPS ... $x.xx".
+# The EPS branch consumes only "EPS" and looks ahead for the amount, so a beat/miss word between the two is still seen.
+BEAT_MISS_RE = re.compile(r"\b(?P<word>beat|miss)\b|EPS(?=[^$]*\$(?P<eps>\d+(?:\.\d+)?))", re.I)
 
 class TaskRequest(BaseModel):
     task: FinanceResearchTask
@@ -21,41 +39,93 @@ def reset():
     STATE.clear(); STATE["sessions"] = {}; return {"ok": True}
 
 class ToolsClient:
-    def __init__(self, spec: Dict[str, Any], context_id: str):
-        self.base = spec["base_url"]; self.ctx = context_id; self.stats: Dict[str,int] = {}
-    def call(self, name: str, **kwargs):
-        payload = {"tool": name, "args": kwargs, "context_id": self.ctx}
-        r = requests.post(f"{self.base}/call", json=payload, timeout=90); r.raise_for_status()
+    def __init__(self, spec: Dict[str, Any], context_id: str, session: Optional[requests.Session] = None):
+        self.base = spec["base_url"]; self.ctx = context_id; self.stats: Dict[str,int] = {}; self.session = session or SESSION
+        self.last_ms: Optional[float] = None  # tools-hub execution time of the last call()
+    def _post(self, endpoint: str, payload: Dict[str, Any], tool: str) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        r = self.session.post(f"{self.base}{endpoint}", json=payload, timeout=90); r.raise_for_status()
+        TOOL_RTT.observe(time.perf_counter() - t0, endpoint=endpoint, tool=tool); TOOL_BYTES.inc(len(r.content), endpoint=endpoint)
+        return r.json()
+    def entry(self, name: str, **kwargs) -> Dict[str, Any]:
+        """Like call(), but returns the raw {"ok", "result", "elapsed_ms"} entry (or {"ok": False, "status", "error"}) as /call_batch does."""
+        try: out = self._post("/call", {"tool": name, "args": kwargs, "context_id": self.ctx}, name)
+        except requests.HTTPError as e:
+            return {"ok": False, "status": e.response.status_code, "error": e.response.text[:500], "skipped": False}
         self.stats[name] = self.stats.get(name, 0) + 1
-        return r.json()["result"]
+        return out
+    def call(self, name: str, **kwargs):
+        out = self._post("/call", {"tool": name, "args": kwargs, "context_id": self.ctx}, name)
+        self.stats[name] = self.stats.get(name, 0) + 1; self.last_ms = out.get("elapsed_ms")
+        return out["result"]
+    def batch(self, calls: List[Tuple[str, Dict[str, Any]]], max_parallel: int = 8) -> List[Dict[str, Any]]:
+        """One /call_batch round-trip. An arg may be ref(i, key) to use an earlier call's result; returns the raw per-call entries."""
+        payload = {"calls": [{"tool": name, "args": args} for name, args in calls], "context_id": self.ctx, "max_parallel": max(1, min(64, max_parallel))}
+        results = self._post("/call_batch", payload, "batch")["results"]
+        for (name, _), res in zip(calls, results):  # successful calls only, as call() and entry() count
+            if res.get("ok"): self.stats[name] = self.stats.get(name, 0) + 1
+        return results
+
+def ref(i: int, key: Optional[str] = None) -> Dict[str, Any]:
+    return {"$ref": i, "key": key}
+
+def scan_beat_miss(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """("Beat" if "beat" occurs anywhere, else "Miss" if "miss" does, else None; the first EPS amount or None)."""
+    beat = miss = False; eps = None
+    for m in BEAT_MISS_RE.finditer(text):
+        word = m.group("word")
+        if word: beat, miss = beat or word.lower() == "beat", miss or word.lower() == "miss"
+        elif eps is None: eps = m.group("eps")
+        if beat and eps is not None: break  # nothing later can change the answer
+    return ("Beat" if beat else "Miss" if miss else None), eps
+
+def _fetch_parse(tools: ToolsClient, url: str, numeric: bool) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    page = tools.entry("http_fetch", url=url, handle=True)
+    if not page["ok"] or "doc_id" not in page["result"]: return page, {"ok": False, "status": 424, "error": "fetch failed", "skipped": True}
+    return page, tools.entry("html_parse", doc_id=page["result"]["doc_id"], handle=numeric, tables=False)
+
+def fetch_contexts(tools: ToolsClient, urls: List[str], numeric: bool) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """(http_fetch entry, html_parse entry) per URL, all documents fetched and parsed concurrently (at most FETCH_PARALLEL at once).
+    One /call_batch round-trip with every fetch queued ahead of the parses; a hub without /call_batch gets per-URL chains on a local pool."""
+    if not urls: return []
+    n = len(urls); width = max(1, min(FETCH_PARALLEL, n))
+    calls = [("http_fetch", {"url": u, "handle": True}) for u in urls] + \
+            [("html_parse", {"doc_id": ref(i, "doc_id"), "handle": numeric, "tables": False}) for i in range(n)]
+    try: results = tools.batch(calls, max_parallel=width)
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code not in (404, 405): raise
+        with ThreadPoolExecutor(max_workers=width, thread_name_prefix="fetch") as pool: return list(pool.map(lambda u: _fetch_parse(tools, u, numeric), urls))
+    return [(results[i], results[n + i]) for i in range(n)]
 
 def solve_task(task: FinanceResearchTask, spec: Dict[str, Any]) -> AnswerSchema:
     tools = ToolsClient(spec, task.task_id)
     texts: List[str] = []; sources: List[SourceItem] = []; trace: List[Dict[str,Any]] = []
-    for url in (task.context_urls or []):
-        page = tools.call("http_fetch", url=url); trace.append({"tool":"http_fetch","url":url,"status":page.get("status")})
-        if "text" in page:
-            parsed = tools.call("html_parse", html=page["text"]); texts.append(parsed.get("text",""))
-            sources.append(SourceItem(url=url)); trace.append({"tool":"html_parse","chars":len(parsed.get("text",""))})
+    # pages stay on the tools hub as doc handles; numeric tasks never pull the parsed text back either
+    numeric = task.category.lower().startswith("numerical")
+    urls = task.context_urls or []; doc_ids: List[str] = []
+    for url, (page, parsed) in zip(urls, fetch_contexts(tools, urls, numeric)):
+        if not page["ok"]: raise HTTPException(502, f"http_fetch {url}: {page.get('error')}")
+        trace.append({"tool":"http_fetch","url":url,"status":page["result"].get("status"),"elapsed_ms":page.get("elapsed_ms")})
+        if parsed["ok"]:
+            out = parsed["result"]; chars = out["chars"] if numeric else len(out.get("text",""))
+            if numeric: doc_ids.append(out["doc_id"])
+            else: texts.append(out.get("text",""))
+            sources.append(SourceItem(url=url)); trace.append({"tool":"html_parse","chars":chars,"elapsed_ms":parsed.get("elapsed_ms")})
     final_answer = "FINAL ANSWER: Unable to determine."
-    blob = "\n".join(texts)
 
-    if task.category.lower().startswith("numerical"):
-        res = tools.call("finance_calc_extract_first_billions", text=blob)
+    if numeric:
+        res = tools.call("finance_calc_extract_first_billions", doc_ids=doc_ids)
         val = res.get("value_billions"); ev = res.get("evidence")
+        trace.append({"tool":"finance_calc_extract_first_billions","found":val is not None,"elapsed_ms":tools.last_ms})
         if val is not None: final_answer = f"FINAL ANSWER: {val:.1f} USD billions. Evidence: {ev}"
     else:
-        if re.search(r"\bbeat\b", blob, flags=re.I):
-            m = re.search(r"EPS[^$]*\$(\d+(\.\d+)?)", blob, flags=re.I)
-            final_answer = f"FINAL ANSWER: Beat. EPS ${m.group(1) if m else '?'}."
-        elif re.search(r"\bmiss\b", blob, flags=re.I):
-            m = re.search(r"EPS[^$]*\$(\d+(\.\d+)?)", blob, flags=re.I)
-            final_answer = f"FINAL ANSWER: Miss. EPS ${m.group(1) if m else '?'}."
+        verdict, eps = scan_beat_miss("\n".join(texts))
+        if verdict: final_answer = f"FINAL ANSWER: {verdict}. EPS ${eps or '?'}."
     return AnswerSchema(final_answer=final_answer, sources=sources, work_notes=None, tool_trace=trace, tool_stats=ToolStats(calls=tools.stats))
 
 @app.post("/task")
 def task(req: TaskRequest = Body(...)) -> AnswerSchema:
-    return solve_task(req.task, req.tools_spec)
+    with TASK_SECONDS.time(category=req.task.category): return solve_task(req.task, req.tools_spec)
 
 def create_app(): return app
 
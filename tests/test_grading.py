@@ -0,0 +1,49 @@
+from __future__ import annotations
+import json, pathlib
+import pytest
+from common.schemas import AnswerSchema, FinanceResearchTask, PerTaskResult, SourceItem
+from green_agent.grading import GradingConfig, domain_index, grade, grade_batch
+from green_agent.rescore import load_tasks, rescore
+
+SAMPLE = pathlib.Path(__file__).resolve().parents[1] / "data" / "tasks" / "sample_tasks.json"
+
+def test_malformed_source_url_is_disallowed_not_an_error():
+    ix = domain_index(frozenset({"127.0.0.1"}))
+    assert ix.allows("http://127.0.0.1:7001/static/x.html")
+    assert not ix.allows("http://[bad")
+
+def test_grade_penalizes_malformed_source_url():
+    task = FinanceResearchTask.model_validate(json.loads(SAMPLE.read_text(encoding="utf-8"))[0])
+    ok = "http://127.0.0.1:7001/static/aapl_10k_2023_excerpt.html"
+    ans = AnswerSchema(final_answer="FINAL ANSWER: 383.3 USD billions.", sources=[SourceItem(url=ok), SourceItem(url="http://[bad")])
+    res = grade(task, ans)
+    assert res.success and res.details["penalty_disallowed_domains"] == ["http://[bad"] and res.score < 1.0
+
+AAPL_URL = "http://127.0.0.1:7001/static/aapl_10k_2023_excerpt.html"
+ANSWERS = ["FINAL ANSWER: 383.3 USD billions.", "FINAL ANSWER: 384.0 billion", "FINAL ANSWER: Beat. EPS was $2.95.",
+           "FINAL ANSWER: Miss, EPS $2.80", "FINAL ANSWER: no idea", ""]
+
+def _sample():
+    return [FinanceResearchTask.model_validate(t) for t in json.loads(SAMPLE.read_text(encoding="utf-8"))]
+
+def test_grade_batch_matches_grade():
+    pytest.importorskip("pandas")
+    pairs = [(t, AnswerSchema(final_answer=a, sources=[SourceItem(url=AAPL_URL)] if i % 2 else [])) for t in _sample() for i, a in enumerate(ANSWERS)]
+    ts, as_ = [t for t, _ in pairs], [a for _, a in pairs]
+    for config in (GradingConfig(), GradingConfig(tolerance=0.1, missing_sources_penalty=0.25)):
+        assert grade_batch(ts, as_, config) == [grade(t, a, config) for t, a in pairs]
+
+def test_rescore_round_trip_keeps_errored_tasks_at_zero(tmp_path):
+    pytest.importorskip("pandas")
+    aapl, msft = _sample(); src = [SourceItem(url=AAPL_URL)]
+    ok = grade(aapl, AnswerSchema(final_answer="FINAL ANSWER: 383.6 USD billions.", sources=src)); ok.details["elapsed_sec"] = 1.5
+    crashed = grade(msft, AnswerSchema(final_answer="FINAL ANSWER: Beat. EPS $2.95.", sources=src))
+    crashed.success, crashed.score = False, 0.0; crashed.details["error"] = "time budget exceeded (120s)"
+    per_task = tmp_path / "per_task.jsonl"; per_task.write_text(ok.model_dump_json() + "\n" + crashed.model_dump_json() + "\n", encoding="utf-8")
+    assert ok.success
+    summary = rescore(load_tasks(SAMPLE), per_task, tmp_path / "out", GradingConfig(tolerance=0.1))
+    assert summary["num_tasks"] == 2 and summary["num_changed"] == 1 and summary["num_unmatched"] == 0 and summary["accuracy"] == 0.0
+    new = [PerTaskResult.model_validate_json(l) for l in (tmp_path / "out" / "per_task.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert not new[0].success and new[0].details["elapsed_sec"] == 1.5
+    assert (new[1].success, new[1].score, new[1].details["error"]) == (False, 0.0, "time budget exceeded (120s)")
+    assert json.loads((tmp_path / "out" / "summary.json").read_text(encoding="utf-8"))["num_changed"] == 1
@@ -0,0 +1,87 @@
+from __future__ import annotations
+import json, pathlib, time
+import pytest
+from fastapi.testclient import TestClient
+from common.schemas import AnswerSchema, FinanceResearchTask, PerTaskResult, SourceItem
+import green_agent.server as green
+
+SAMPLE = pathlib.Path(__file__).resolve().parents[1] / "data" / "tasks" / "sample_tasks.json"
+AAPL_URL = "http://127.0.0.1:7001/static/aapl_10k_2023_excerpt.html"
+
+def _tasks():
+    return [FinanceResearchTask.model_validate(t) for t in json.loads(SAMPLE.read_text(encoding="utf-8"))]
+
+def _record(task_id: str, **details) -> PerTaskResult:
+    return PerTaskResult(task_id=task_id, category="c", success=not details, score=0.0, details=details, answer=AnswerSchema(final_answer="x"))
+
+def test_open_checkpoint_keeps_completed_and_drops_errored(tmp_path):
+    recs = [_record("done"), _record("crashed", error="ConnectionError: boom"), _record("slow", error="time budget exceeded (120s)")]
+    (tmp_path / "per_task.jsonl").write_text("".join(r.model_dump_json() + "\n" for r in recs) + '{"torn', encoding="utf-8")
+    done, f = green._open_checkpoint(tmp_path, resume=True); f.close()
+    assert list(done) == ["done"]
+    assert [json.loads(l)["task_id"] for l in (tmp_path / "per_task.jsonl").read_text(encoding="utf-8").splitlines()] == ["done"]
+
+def test_resume_reruns_only_errored_tasks(tmp_path, monkeypatch):
+    aapl, msft = _tasks()
+    out = tmp_path / "run"; out.mkdir()
+    (out / "per_task.jsonl").write_text(_record(aapl.task_id).model_dump_json() + "\n" + _record(msft.task_id, error="Timeout").model_dump_json() + "\n", encoding="utf-8")
+    called = []
+    def participant(url, task, spec, timeout=600):
+        called.append(task["task_id"]); return AnswerSchema(final_answer="FINAL ANSWER: Beat. EPS $2.95.", sources=[SourceItem(url=AAPL_URL)])
+    monkeypatch.setattr(green, "AB_OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(green, "fetch_tools_spec", lambda url: {"base_url": url, "tools": []})
+    monkeypatch.setattr(green, "call_participant", participant)
+    body = {"purple_agent_url": "http://purple", "tools_base_url": "http://127.0.0.1:9", "tasks": [t.model_dump() for t in (aapl, msft)],
+            "resume": True, "output_subdir": "run"}
+    r = TestClient(green.app).post("/assess", json=body)
+    assert r.status_code == 200 and called == [msft.task_id]
+    lines = [PerTaskResult.model_validate_json(l) for l in (out / "per_task.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [l.task_id for l in lines] == [aapl.task_id, msft.task_id] and "error" not in lines[1].details
+
+@pytest.mark.parametrize("path", ["/assess", "/assess/stream"])
+def test_unreachable_tools_hub_is_an_http_error(path):
+    body = {"purple_agent_url": "http://purple", "tools_base_url": "http://127.0.0.1:9", "tasks": [_tasks()[0].model_dump()]}
+    r = TestClient(green.app).post(path, json=body)
+    assert r.status_code == 502 and "tools hub" in r.json()["detail"]
+
+def test_invalid_corpus_rows_are_skipped_and_counted(tmp_path, monkeypatch):
+    aapl, msft = _tasks()
+    corpus = tmp_path / "tasks"; corpus.mkdir()
+    (corpus / "c.jsonl").write_text('{"task_id":"x"}\n' + aapl.model_dump_json() + "\n[1]\n" + msft.model_dump_json() + "\n", encoding="utf-8")
+    monkeypatch.setattr(green, "TASKS_ROOT", corpus)
+    monkeypatch.setattr(green, "AB_OUTPUT_DIR", tmp_path / "out")
+    monkeypatch.setattr(green, "fetch_tools_spec", lambda url: {"base_url": url, "tools": []})
+    monkeypatch.setattr(green, "call_participant", lambda url, task, spec, timeout=600: AnswerSchema(final_answer="FINAL ANSWER: Beat."))
+    for categories, invalid in ((None, 2), ([aapl.category, msft.category], 1)):  # a row without a category is filtered out first
+        body = {"purple_agent_url": "http://purple", "tools_base_url": "http://127.0.0.1:9",
+                "task_source": {"path": "c.jsonl", "categories": categories}}
+        r = TestClient(green.app).post("/assess/stream", json=body)
+        events = [json.loads(l) for l in r.text.splitlines()]
+        assert r.status_code == 200 and sorted(e["result"]["task_id"] for e in events[:-1]) == sorted([aapl.task_id, msft.task_id])  # completion order
+        assert events[-1]["summary"]["num_tasks"] == 2 and events[-1]["summary"]["num_invalid"] == invalid
+        assert len((tmp_path / "out" / "per_task.jsonl").read_text(encoding="utf-8").splitlines()) == 2
+
+def test_results_are_checkpointed_in_completion_order(tmp_path, monkeypatch):
+    aapl, msft = _tasks(); ckpt = tmp_path / "per_task.jsonl"
+    def participant(url, task, spec, timeout=600):
+        if task["task_id"] == aapl.task_id:  # the first task only finishes once the second is already checkpointed
+            for _ in range(500):
+                if ckpt.exists() and msft.task_id in ckpt.read_text(encoding="utf-8"): break
+                time.sleep(0.01)
+        return AnswerSchema(final_answer="FINAL ANSWER: Beat.")
+    monkeypatch.setattr(green, "AB_OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(green, "fetch_tools_spec", lambda url: {"base_url": url, "tools": []})
+    monkeypatch.setattr(green, "call_participant", participant)
+    body = {"purple_agent_url": "http://purple", "tools_base_url": "http://127.0.0.1:9", "tasks": [t.model_dump() for t in (aapl, msft)], "max_concurrency": 2}
+    r = TestClient(green.app).post("/assess", json=body)
+    assert [t["task_id"] for t in r.json()["per_task"]] == [aapl.task_id, msft.task_id]
+    assert [json.loads(l)["task_id"] for l in ckpt.read_text(encoding="utf-8").splitlines()] == [msft.task_id, aapl.task_id]
+
+@pytest.mark.parametrize("path", ["/assess", "/assess/stream"])
+@pytest.mark.parametrize("name, content", [("missing.jsonl", None), ("bad.json", "[{"), ("obj.json", '{"task_id": "x"}')])
+def test_unreadable_corpus_is_a_400(tmp_path, monkeypatch, path, name, content):
+    if content is not None: (tmp_path / name).write_text(content, encoding="utf-8")
+    monkeypatch.setattr(green, "TASKS_ROOT", tmp_path)
+    body = {"purple_agent_url": "http://purple", "tools_base_url": "http://127.0.0.1:9", "task_source": {"path": name}}
+    r = TestClient(green.app).post(path, json=body)
+    assert r.status_code == 400 and name in r.json()["detail"]
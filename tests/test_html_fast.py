@@ -0,0 +1,31 @@
+from __future__ import annotations
+import random
+import pytest
+from tools.html_fast import parse_html, parse_html_bs4
+
+pytest.importorskip("bs4")
+pytestmark = pytest.mark.filterwarnings("ignore:The input looks more like")
+
+PIECES = ["<p>", "</p>", "<div>", "</div>", "<b>", "</b>", "<a href='u{n}'>", "</a>", "<table>", "<tr>", "<td>", "</td>", "</tr>", "</table>",
+          "<script>var x='{n}'</script>", "<style>p{{}}</style>", "<!-- c{n} -->", "<br>", "<span>", "</span>", "<ul><li>", "</li></ul>",
+          "<body>", "</body>", "<html>", "</html>", "<head>", "</head>", "<title>t{n}</title>", "</BODY>", "</html >", "\n", " ", "w{n}", "&amp;"]
+
+@pytest.mark.parametrize("html", [
+    "<p>a</p></body><p>b<a href=x>c</a></p>",
+    "<p>a</html>tail<b>d</b>",
+    "<html><body>a</body></html>\n<p>after <a href='/n'>next</a></p>",
+    "<a href='u'></BODY>text",
+    "<html><body><p>x</p></body></html>\n",
+])
+def test_content_after_closing_tags_matches_bs4(html):
+    assert parse_html(html, tables=False)[:2] == parse_html_bs4(html)
+
+def test_random_tag_soup_matches_bs4():
+    rng = random.Random(0)
+    for _ in range(2000):
+        html = "".join(rng.choice(PIECES).format(n=rng.randint(0, 99)) for _ in range(rng.randint(1, 25)))
+        assert parse_html(html, tables=False)[:2] == parse_html_bs4(html), html
+
+def test_table_after_stray_html_close_is_kept():
+    tables = parse_html("<p>x</p></html><table><tr><td>Revenue</td><td>12</td></tr></table>")[2]
+    assert [t["rows"] for t in tables] == [["Revenue"]]
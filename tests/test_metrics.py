@@ -0,0 +1,12 @@
+from __future__ import annotations
+from fastapi.testclient import TestClient
+import launcher
+
+def test_inprocess_routes_are_labeled_without_the_mount_prefix():
+    client = TestClient(launcher.create_inprocess_app())
+    assert client.get("/green/agent_card").status_code == 200 and client.get("/purple/metrics").status_code == 200
+    assert client.get("/tools").status_code == 200
+    green = client.get("/green/metrics").text; tools = client.get("/metrics").text
+    assert 'green_http_request_duration_seconds_count{method="GET",path="/agent_card",status="200"}' in green
+    assert 'green_http_response_bytes_total{path="/agent_card"}' in green and 'path="other"' not in green
+    assert 'path="/tools",status="200"}' in tools
@@ -0,0 +1,18 @@
+from __future__ import annotations
+import threading, time
+from tools.search_index import SearchIndex
+
+def test_queries_do_not_wait_for_the_background_rescan(tmp_path):
+    docs = tmp_path / "docs"; docs.mkdir(); (docs / "a.txt").write_text("Apple net sales were $383 billion", encoding="utf-8")
+    ix = SearchIndex(str(tmp_path / "ix.sqlite3"), [("/d/", docs)], refresh_sec=0.05)
+    release = threading.Event(); build = ix.refresh
+    ix.refresh = lambda force=False: release.wait(5) and build(force)
+    try:
+        t0 = time.perf_counter(); assert ix.search("apple sales") == [] and time.perf_counter() - t0 < 1  # first build still blocked
+        release.set()
+        for _ in range(200):
+            if ix.search("apple sales"): break
+            time.sleep(0.01)
+        assert [r["link"].rsplit("/", 1)[1] for r in ix.search("apple sales")] == ["a.txt"]
+    finally:
+        release.set(); ix.stop()
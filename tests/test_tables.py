@@ -0,0 +1,38 @@
+from __future__ import annotations
+from tools.html_fast import parse_html
+from tools.tables import TableIndex
+
+INCOME = """<table><caption>(in millions, except per share amounts)</caption>
+<tr><th></th><th>2024</th></tr>
+<tr><td>Net income</td><td>$ 1,000</td></tr>
+<tr><td>Diluted EPS</td><td>$ 6.13</td></tr>
+<tr><td>Earnings per share:</td><td></td></tr>
+<tr><td>Basic</td><td>6.16</td></tr>
+<tr><td>Diluted</td><td>6.13</td></tr>
+<tr><td>Shares used in computing earnings per share:</td><td></td></tr>
+<tr><td>Diluted</td><td>15,408</td></tr>
+</table>"""
+
+def test_except_per_share_caption_leaves_per_share_rows_unscaled():
+    t = parse_html(INCOME)[2][0]
+    values = dict(zip(t["rows"], t["data"][0]))
+    assert t["scale"] == 1e6 and values["Net income"] == 1e9 and values["Diluted EPS"] == 6.13
+    assert t["data"][0][3:5] == [6.16, 6.13]
+    assert t["data"][0][6] == 15408e6  # share counts are not per-share amounts
+    assert t["unscaled_rows"] == [1, 3, 4]
+
+def test_plain_millions_caption_scales_every_row():
+    t = parse_html(INCOME.replace(", except per share amounts", ""))[2][0]
+    assert t["data"][0][1] == 6.13e6 and t["unscaled_rows"] == []
+
+TEN_K = """<table><caption>(in millions)</caption>
+<tr><td></td><td colspan="2">2024</td><td colspan="2">2023</td></tr>
+<tr><td>Revenue</td><td>$</td><td>391,035</td><td>$</td><td>383,285</td></tr>
+<tr><td>Net income</td><td>$</td><td>93,736</td><td>$</td><td colspan="2">96,995</td></tr>
+</table>"""
+
+def test_td_colspan_headers_label_every_spanned_column():
+    t = parse_html(TEN_K)[2][0]
+    assert t["columns"] == ["2024", "2023"] and t["rows"] == ["Revenue", "Net income"]
+    assert t["data"] == [[391035e6, 93736e6], [383285e6, 96995e6]]
+    assert TableIndex(parse_html(TEN_K)[2]).lookup("Revenue", "2024") == [{"table": 0, "row": "Revenue", "column": "2024", "value": 391035e6}]
@@ -0,0 +1,42 @@
+from __future__ import annotations
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from tools.server import app
+
+HTML = "<p>Total net sales were $383,285 million in 2023.</p>"
+
+def _batch(calls, **kw):
+    return TestClient(app).post("/call_batch", json={"calls": calls, "context_id": "test-batch", **kw})
+
+def test_ref_passes_an_earlier_result_field():
+    r = _batch([{"tool": "html_parse", "args": {"html": HTML, "tables": False}},
+                {"tool": "finance_calc_extract_first_billions", "args": {"text": {"$ref": 0, "key": "text"}}}])
+    assert r.status_code == 200 and r.json()["ok"]
+    parse, extract = r.json()["results"]
+    assert parse["ok"] and "elapsed_ms" in parse
+    assert extract["result"]["value_billions"] == pytest.approx(383.285)
+
+@pytest.mark.parametrize("ref", ["0", 1.5, True, -1, 1, 7])
+def test_invalid_ref_rejects_the_batch(ref):
+    r = _batch([{"tool": "html_parse", "args": {"html": HTML}}, {"tool": "html_parse", "args": {"html": {"$ref": ref}}}])
+    assert r.status_code == 400 and r.json()["detail"].startswith("call 1: arg 'html'")
+
+def test_failed_dependency_skips_with_424():
+    r = _batch([{"tool": "no_such_tool", "args": {}},
+                {"tool": "html_parse", "args": {"html": {"$ref": 0, "key": "text"}}},
+                {"tool": "html_parse", "args": {"html": HTML}}])
+    failed, skipped, independent = r.json()["results"]
+    assert r.status_code == 200 and not r.json()["ok"]
+    assert (failed["status"], failed["skipped"]) == (404, False)
+    assert (skipped["status"], skipped["skipped"]) == (424, True)
+    assert independent["ok"]
+
+def test_missing_ref_key_is_424():
+    r = _batch([{"tool": "html_parse", "args": {"html": HTML}}, {"tool": "html_parse", "args": {"html": {"$ref": 0, "key": "nope"}}}])
+    assert r.json()["results"][1]["status"] == 424
+
+def test_missing_bs4_is_a_503(monkeypatch):
+    monkeypatch.setitem(sys.modules, "bs4", None)  # import bs4 now raises ModuleNotFoundError
+    r = TestClient(app).post("/call", json={"tool": "html_parse", "args": {"html": "<html><body><p>x</p></body></html><script>track()</script>"}})
+    assert r.status_code == 503 and "beautifulsoup4" in r.json()["detail"]
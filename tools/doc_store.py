@@ -0,0 +1,40 @@
+from __future__ import annotations
+import hashlib, threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from fastapi import HTTPException
+
+class DocStore:
+    """Bounded in-memory store of documents keyed by content hash (doc_id), evicted least-recently-used first.
+
+    Lets tools pass large filings by handle: http_fetch stores the page once and later calls send only the doc_id.
+    """
+    def __init__(self, max_bytes: int = 128 << 20):
+        self.max_bytes = int(max_bytes); self._docs: "OrderedDict[str, str]" = OrderedDict(); self._bytes = 0
+        self._lock = threading.Lock(); self.stats: Dict[str, int] = {"puts": 0, "gets": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def doc_id(text: str) -> str:
+        return "sha256:" + hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+    def put(self, text: str) -> str:
+        did = self.doc_id(text); size = len(text)
+        with self._lock:
+            self.stats["puts"] += 1
+            if did in self._docs: self._docs.move_to_end(did); return did
+            self._docs[did] = text; self._bytes += size
+            while self._bytes > self.max_bytes and len(self._docs) > 1:
+                _, old = self._docs.popitem(last=False); self._bytes -= len(old); self.stats["evictions"] += 1
+        return did
+
+    def get(self, did: str) -> str:
+        with self._lock:
+            self.stats["gets"] += 1
+            text: Optional[str] = self._docs.get(did)
+            if text is None:
+                self.stats["misses"] += 1
+                raise HTTPException(404, f"Unknown or evicted doc_id {did}; fetch the document again")
+            self._docs.move_to_end(did); return text
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock: return {**self.stats, "docs": len(self._docs), "bytes": self._bytes, "max_bytes": self.max_bytes}
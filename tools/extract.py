@@ -0,0 +1,100 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+# Single-pass extraction of monetary, EPS and percentage mentions. One precompiled pattern walks the document once;
+# each mention carries its character offset, normalized value, unit and surrounding sentence (clipped to
+# SENTENCE_WINDOW chars each way). Sentence breaks are tracked in the same forward pass, so cost is linear in size.
+# first_billions has its own scale-only scan rather than filtering the full mention stream.
+
+# horizontal whitespace only, so a number and its unit never straddle a line break. Commas are transparent inside
+# numbers and before the unit, which keeps first_billions identical to the comma-stripping regex it replaced.
+_NL = r"\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"  # the separators str.splitlines() honours
+_HSPACE = r"\t\x1f \xa0\u1680\u2000-\u200a\u202f\u205f\u3000"  # str.isspace() minus the separators above
+_HS = rf"[{_HSPACE}]*"
+_GAP = rf"[{_HSPACE},]*"
+# a number is matched "atomically" (lookahead + backreference, since atomic groups need Python 3.11): once its digits
+# are read they are never re-split, which avoids backtracking through every digit run that is not followed by a unit
+_NUM = r"(?=(?P<{n}>\d[\d,]*(?:\.,*\d[\d,]*)?))(?P={n})"
+_UNIT = rf"(?:{_GAP}(?P<{{s}}>thousand|million|billion|trillion|bn\b|mn\b)|{_HS}(?P<{{p}}>%|percent\b|per cent\b))"
+# bare numbers (years, table cells) never match, so only candidate mentions reach Python; the leading lookahead lets
+# the scanner skip positions that cannot start a mention (the EPS keywords are looked up separately, and only for a
+# "$n" without a scale, so common letters like "e" do not have to pass the prefilter)
+_MENTION = re.compile(
+    r"(?=[\d$Uu])(?:"
+    rf"(?P<cur>US\$|\$|\bUSD\b){_HS}{_NUM.format(n='num')}{_UNIT.format(s='scale', p='pct')}?"
+    rf"|{_NUM.format(n='num2')}{_UNIT.format(s='scale2', p='pct2')})",
+    re.I)
+_EPS_KEYWORD = re.compile(r"\bEPS\b|\bearnings per (?:diluted |basic )?share\b", re.I)
+# first_billions only wants "<number> million|billion": it finds the scale word first (a literal-led scan that skips the
+# number-dense prose in between) and matches the mention ending at it, starting from the run of number and gap
+# characters just before the word, so a mention can only start inside that run
+_SCALE_WORD = re.compile(r"[mb]illion", re.I)
+_SCALE_MENTION = re.compile(rf"{_NUM.format(n='num')}{_GAP}(?P<scale>million|billion)", re.I)
+_GAP_CHAR = re.compile(rf"[{_HSPACE},]")
+_PER_SHARE = re.compile(rf"{_HS}(?:per|a){_HS}(?:diluted{_HS}|basic{_HS})?share\b", re.I)
+_SENT_BREAK = re.compile(r"[.!?](?=\s)|[\r\n]")
+_LINE_BREAK = re.compile(rf"[{_NL}]")
+_NL_CHARS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+SCALES = {"thousand": 1e3, "million": 1e6, "mn": 1e6, "billion": 1e9, "bn": 1e9, "trillion": 1e12}
+SENTENCE_WINDOW = 400
+KINDS = ("money", "eps", "percent")
+
+def line_at(text: str, offset: int) -> str:
+    left = max(text.rfind(ch, 0, offset) for ch in _NL_CHARS) + 1
+    m = _LINE_BREAK.search(text, offset)
+    return text[left:m.start() if m else len(text)]
+
+def iter_mentions(text: str, kinds: Optional[set] = None, with_sentence: bool = True) -> Iterator[Dict[str, Any]]:
+    """Yields mentions in document order. kinds filters to a subset of KINDS."""
+    kinds = set(kinds or KINDS)
+    # sentence breaks are consumed in lockstep with the mentions (only as far as a mention needs them), so sentence
+    # lookup adds no rescanning; likewise the EPS keyword search resumes where it stopped within the current sentence
+    breaks = _SENT_BREAK.finditer(text); nxt = next(breaks, None); left = 0
+    kw_left = kw_from = -1; kw_seen = False
+    for m in _MENTION.finditer(text):
+        cur = m.group("cur")
+        if cur: num, scale, pct = m.group("num", "scale", "pct")
+        else: num, scale, pct = m.group("num2", "scale2", "pct2")
+        if pct: kind = "percent"
+        elif scale or not cur: kind = "money"
+        else: kind = None  # "$n": EPS if an EPS keyword precedes it in its sentence or "per share" follows it
+        if kind is not None and kind not in kinds: continue
+        start, end = m.span()
+        if kind is None or with_sentence:
+            while nxt is not None and nxt.start() < start: left = nxt.end(); nxt = next(breaks, None)
+        if kind is None:
+            if kw_left != left: kw_left = kw_from = left; kw_seen = False
+            if not kw_seen: kw_seen = _EPS_KEYWORD.search(text, kw_from, start + 1) is not None; kw_from = start
+            kind = "eps" if kw_seen or _PER_SHARE.match(text, end) else "money"
+            if kind not in kinds: continue
+        number = float(num.replace(",", ""))
+        if kind == "percent": value, unit = number, "%"
+        elif kind == "eps": value, unit = number, "USD/share"
+        else: value, unit = number * (SCALES[scale.lower()] if scale else 1.0), ("USD" if cur else None)
+        out = {"kind": kind, "offset": start, "end": end, "text": m.group(0), "number": number, "scale": scale.lower() if scale else None,
+               "value": value, "unit": unit}
+        if with_sentence:
+            right = len(text) if nxt is None else (nxt.start() if nxt.group() in "\r\n" else nxt.end())
+            out["sentence"] = text[max(left, start - SENTENCE_WINDOW):min(right, end + SENTENCE_WINDOW)].strip()
+        yield out
+
+def extract_mentions(text: str, kinds: Optional[List[str]] = None, limit: Optional[int] = None, with_sentence: bool = True) -> Dict[str, Any]:
+    mentions: List[Dict[str, Any]] = []; total = 0
+    for mt in iter_mentions(text, set(kinds) if kinds else None, with_sentence):
+        total += 1
+        if limit is None or len(mentions) < limit: mentions.append(mt)
+    return {"mentions": mentions, "total": total, "truncated": total > len(mentions)}
+
+def first_billions(text: str) -> Dict[str, Any]:
+    """finance_calc_extract_first_billions: the first "<number> million|billion" mention, in USD billions, with its line."""
+    for w in _SCALE_WORD.finditer(text):
+        lo = w.start()
+        while lo and _GAP_CHAR.match(text, lo - 1): lo -= 1
+        while lo and (text[lo - 1].isdecimal() or text[lo - 1] in ",."): lo -= 1
+        m = _SCALE_MENTION.search(text, lo, w.end())
+        if m:
+            number = float(m.group("num").replace(",", ""))
+            return {"value_billions": number / 1000.0 if m.group("scale").lower() == "million" else number,
+                    "evidence": line_at(text, m.start()).strip()}
+    return {"value_billions": None, "evidence": None}
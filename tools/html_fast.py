@@ -0,0 +1,116 @@
+from __future__ import annotations
+import hashlib, re, threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from lxml import etree
+from tools.tables import build_table
+
+# Drop-in replacement for the BeautifulSoup path in tools.server._html_parse: walks the lxml tree once and yields
+# the same text (stripped strings joined by "\n", script/style/template and comments skipped) and the same link list,
+# plus every <table> in the columnar form described in tools.tables. The one place the trees differ is content after a
+# stray </body> or </html>: libxml2 drops it, while bs4 closes the open elements there and keeps going, so such documents
+# take the bs4 path for text and links (filings normally end with those tags and whitespace only).
+SKIP_TAGS = {"script", "style", "template"}  # bs4 also leaves <template> strings out of get_text
+ROW_GROUPS = {"thead", "tbody", "tfoot"}; CELL_TAGS = {"td", "th"}
+_DOC_CLOSE = re.compile(r"</(?:body|html)\s*>", re.I)
+_DOC_END = re.compile(r"(?:\s|</(?:body|html)\s*>)*\Z", re.I)
+
+def _strings(el, out: List[str]):
+    # appends the stripped, non-empty strings of `el` and its descendants in document order (not el's own tail);
+    # iterative because deeply nested filings can exceed the recursion limit
+    stack: List[Tuple[Any, bool]] = [(el, False)]
+    while stack:
+        node, tail = stack.pop()
+        if tail:
+            s = node.tail.strip() if node.tail else ""
+            if s: out.append(s)
+            continue
+        if not isinstance(node.tag, str) or node.tag in SKIP_TAGS: continue
+        if node.text:
+            s = node.text.strip()
+            if s: out.append(s)
+        for child in reversed(node):
+            stack.append((child, True)); stack.append((child, False))
+
+def _parse_root(html: str):
+    parser = etree.HTMLParser(huge_tree=True)
+    parser.feed(_DOC_CLOSE.sub("", html))  # implied at end of input; removed so tables after a stray one are kept
+    try: return parser.close()
+    except etree.XMLSyntaxError: return None  # empty or whitespace-only input
+
+def _content_after_close(html: str) -> bool:
+    m = _DOC_CLOSE.search(html)
+    return m is not None and _DOC_END.match(html, m.start()) is None
+
+def parse_html_bs4(html: str) -> Tuple[str, List[Dict[str, Any]]]:
+    from bs4 import BeautifulSoup  # only TOOLS_HTML_ENGINE=bs4 and documents with content after </body> or </html> need it
+    soup = BeautifulSoup(html, "lxml")
+    for s in soup(["script","style"]): s.extract()
+    text = soup.get_text(separator="\n", strip=True)
+    links = [{"text": a.get_text(strip=True), "href": a.get("href")} for a in soup.find_all("a", href=True)]
+    return text, links
+
+def _text(el) -> str:
+    out: List[str] = []; _strings(el, out); return " ".join(out)
+
+def extract_tables(root) -> List[Dict[str, Any]]:
+    tables: List[Dict[str, Any]] = []
+    for tbl in root.iter("table"):
+        grid: List[List[Tuple[str, bool, bool]]] = []
+        trs = (tr for sect in tbl for tr in ((sect,) if sect.tag == "tr" else sect if sect.tag in ROW_GROUPS else ()) if tr.tag == "tr")
+        for tr in trs:
+            row: List[Tuple[str, bool, bool]] = []
+            for cell in tr:
+                if cell.tag not in CELL_TAGS: continue
+                t = _text(cell); is_th = cell.tag == "th"
+                try: span = max(1, min(int(cell.get("colspan") or 1), 64))
+                except ValueError: span = 1
+                # every cell repeats across its span, flagged as spanned; build_table keeps the copies in header rows only
+                row += [(t, is_th, False)] + [(t, is_th, True)] * (span - 1)
+            if row: grid.append(row)
+        cap = tbl.find("caption"); prev = tbl.getprevious()
+        t = build_table(len(tables), grid, _text(cap) if cap is not None else None, _text(prev)[-200:] if prev is not None else "")
+        if t is not None: tables.append(t)
+    return tables
+
+def tables_from_html(html: str) -> List[Dict[str, Any]]:
+    root = _parse_root(html) if html else None
+    return extract_tables(root) if root is not None else []
+
+def parse_html(html: str, tables: bool = True) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    root = _parse_root(html) if html else None
+    if root is None: return "", [], []
+    if _content_after_close(html): return (*parse_html_bs4(html), extract_tables(root) if tables else [])
+    out: List[str] = []; _strings(root, out)
+    links = []
+    for a in root.iter("a"):
+        href = a.get("href")
+        if href is None: continue
+        parts: List[str] = []; _strings(a, parts)
+        links.append({"text": "".join(parts), "href": href})
+    return "\n".join(out), links, (extract_tables(root) if tables else [])
+
+class ParseCache:
+    """Bounded LRU of parse results keyed by sha256 of the HTML, shared by all requests to the tools hub."""
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = int(max_entries); self._items: "OrderedDict[str, Any]" = OrderedDict(); self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def key(html: str) -> str:
+        return hashlib.sha256(html.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            v = self._items.get(key)
+            if v is None: self.stats["misses"] += 1; return None
+            self._items.move_to_end(key); self.stats["hits"] += 1; return v
+
+    def put(self, key: str, value: Any):
+        if self.max_entries <= 0: return
+        with self._lock:
+            self._items[key] = value; self._items.move_to_end(key)
+            while len(self._items) > self.max_entries: self._items.popitem(last=False); self.stats["evictions"] += 1
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock: return {**self.stats, "entries": len(self._items), "max_entries": self.max_entries}
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import os, json, time, hashlib, tempfile, threading, pathlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = "agentify/0.1"
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "agentify_http_cache")
+DEFAULT_CACHE_MAX_MB = 256.0
+
+class SessionPool:
+    """One keep-alive requests.Session per scheme://host, shared by all threads of the tools hub."""
+    def __init__(self, pool_maxsize: int = 16):
+        self.pool_maxsize = pool_maxsize; self._sessions: Dict[str, requests.Session] = {}; self._lock = threading.Lock()
+
+    def get(self, url: str) -> requests.Session:
+        parts = urlsplit(url); key = f"{parts.scheme}://{parts.netloc}"
+        s = self._sessions.get(key)
+        if s is not None: return s
+        with self._lock:
+            s = self._sessions.get(key)
+            if s is None:
+                s = requests.Session(); s.headers["User-Agent"] = USER_AGENT
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                s.mount("http://", adapter); s.mount("https://", adapter)
+                self._sessions[key] = s
+            return s
+
+class HttpCache:
+    """Content cache on disk keyed by sha256(url), with ETag/Last-Modified revalidation and size-bounded LRU eviction.
+
+    Entries younger than `ttl_sec` are served straight from disk; older ones are revalidated with a conditional GET.
+    Each entry is `<key>.body` (raw bytes) plus `<key>.json` (url, validators, content type, encoding, size).
+    """
+    def __init__(self, root: os.PathLike, max_bytes: int = 256 << 20, ttl_sec: float = 300.0, sessions: Optional[SessionPool] = None):
+        self.root = pathlib.Path(root); self.max_bytes = int(max_bytes); self.ttl_sec = float(ttl_sec)
+        self.sessions = sessions or SessionPool()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0, "uncacheable": 0}
+        self._lru: "OrderedDict[str, int]" = OrderedDict(); self._bytes = 0; self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        metas = []
+        for p in self.root.glob("*.json"):
+            try: metas.append((p.stat().st_mtime, p.stem, int(json.loads(p.read_text(encoding="utf-8")).get("size", 0))))
+            except Exception: continue
+        for _, key, size in sorted(metas): self._lru[key] = size; self._bytes += size
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[pathlib.Path, pathlib.Path]:
+        return self.root / f"{key}.body", self.root / f"{key}.json"
+
+    def _load(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        body_p, meta_p = self._paths(key)
+        try: return json.loads(meta_p.read_text(encoding="utf-8")), body_p.read_bytes()
+        except Exception: return None
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock: self.stats[name] += n
+
+    @staticmethod
+    def _write(p: pathlib.Path, data: bytes):
+        tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp"); tmp.write_bytes(data); os.replace(tmp, p)
+
+    def _touch(self, key: str, meta: Optional[Dict[str, Any]] = None):
+        # the meta file's mtime is the persisted LRU clock
+        _, meta_p = self._paths(key)
+        try:
+            if meta is None: os.utime(meta_p)
+            else: self._write(meta_p, json.dumps(meta).encode("utf-8"))
+        except Exception: pass
+        with self._lock:
+            if key in self._lru: self._lru.move_to_end(key)
+
+    def _store(self, key: str, meta: Dict[str, Any], body: bytes):
+        if len(body) > self.max_bytes: self._count("uncacheable"); return
+        body_p, meta_p = self._paths(key)
+        self._write(body_p, body); self._write(meta_p, json.dumps(meta).encode("utf-8"))
+        with self._lock:
+            self._bytes += len(body) - self._lru.pop(key, 0); self._lru[key] = len(body)
+            victims = []
+            while self._bytes > self.max_bytes and len(self._lru) > 1:
+                k, size = self._lru.popitem(last=False); self._bytes -= size; victims.append(k)
+            self.stats["evictions"] += len(victims)
+        for k in victims:
+            for p in self._paths(k): p.unlink(missing_ok=True)
+
+    def fetch(self, url: str, timeout: int = 30, use_cache: bool = True) -> Tuple[Dict[str, Any], bytes, str]:
+        """Returns (meta, body, cache_status) where cache_status is hit | revalidated | miss | bypass."""
+        key = self.key(url); cached = self._load(key) if use_cache else None
+        headers: Dict[str, str] = {}
+        if cached is not None:
+            meta, body = cached
+            if time.time() - float(meta.get("stored_at", 0)) < self.ttl_sec:
+                self._count("hits"); self._touch(key); return meta, body, "hit"
+            if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+        r = self.sessions.get(url).get(url, headers=headers, timeout=timeout)
+        if cached is not None and r.status_code == 304:
+            meta, body = cached; meta["stored_at"] = time.time()
+            self._count("revalidated"); self._touch(key, meta); return meta, body, "revalidated"
+        r.raise_for_status()
+        meta = {"url": url, "status": r.status_code, "content_type": r.headers.get("content-type", "").lower(),
+                "encoding": r.encoding or r.apparent_encoding or "utf-8", "etag": r.headers.get("etag"),
+                "last_modified": r.headers.get("last-modified"), "size": len(r.content), "stored_at": time.time()}
+        if not use_cache: return meta, r.content, "bypass"
+        self._count("misses")
+        if "no-store" in r.headers.get("cache-control", "").lower(): self._count("uncacheable")
+        else: self._store(key, meta, r.content)
+        return meta, r.content, "miss"
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock: entries, used = len(self._lru), self._bytes
+        lookups = self.stats["hits"] + self.stats["revalidated"] + self.stats["misses"]
+        return {**self.stats, "entries": entries, "bytes": used, "max_bytes": self.max_bytes,
+                "hit_rate": round((self.stats["hits"] + self.stats["revalidated"]) / lookups, 3) if lookups else 0.0}
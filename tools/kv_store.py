@@ -0,0 +1,189 @@
+from __future__ import annotations
+import json, os, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from fastapi import HTTPException
+
+# Scratch key-value state for kv_put/kv_get, scoped by context_id (one context per task).
+# Both backends enforce a per-context and a global byte cap (values are sized by their JSON encoding), drop contexts
+# idle for longer than ttl_sec, and evict least-recently-used entries first. release() drops a context outright;
+# the green agent calls it when a task finishes.
+
+def _encode(key: str, value: Any) -> Tuple[str, int]:
+    text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return text, len(key) + len(text)
+
+class _Limits:
+    def __init__(self, max_bytes: int, max_context_bytes: int, ttl_sec: float):
+        self.max_bytes = int(max_bytes); self.max_context_bytes = int(min(max_context_bytes, max_bytes)); self.ttl_sec = float(ttl_sec)
+        self.stats: Dict[str, int] = {"puts": 0, "gets": 0, "misses": 0, "evictions": 0, "expired_contexts": 0, "released_contexts": 0}
+
+    def _check(self, context_id: str, size: int):
+        if not context_id: raise HTTPException(400, "context_id required")
+        if size > self.max_context_bytes: raise HTTPException(413, f"value of {size} bytes exceeds the per-context cap of {self.max_context_bytes}")
+
+class MemoryKV(_Limits):
+    """In-process backend: contexts and the keys inside each context are kept in access order (OrderedDicts)."""
+    def __init__(self, max_bytes: int = 64 << 20, max_context_bytes: int = 4 << 20, ttl_sec: float = 3600.0):
+        super().__init__(max_bytes, max_context_bytes, ttl_sec)
+        self._ctx: "OrderedDict[str, Dict[str, Any]]" = OrderedDict(); self._bytes = 0; self._lock = threading.Lock()
+
+    def _drop(self, context_id: str) -> int:
+        c = self._ctx.pop(context_id); self._bytes -= c["bytes"]; return len(c["items"])
+
+    def _expire(self, now: float):
+        # the context order is last-access order, so idle contexts are always at the front
+        while self._ctx and self.ttl_sec > 0:
+            cid, c = next(iter(self._ctx.items()))
+            if now - c["atime"] <= self.ttl_sec: break
+            self._drop(cid); self.stats["expired_contexts"] += 1
+
+    def _touch(self, context_id: str, now: float) -> Optional[Dict[str, Any]]:
+        c = self._ctx.get(context_id)
+        if c is not None: c["atime"] = now; self._ctx.move_to_end(context_id)
+        return c
+
+    def _evict_one(self, c: Dict[str, Any]):
+        _, (_, size) = c["items"].popitem(last=False); c["bytes"] -= size; self._bytes -= size; self.stats["evictions"] += 1
+
+    def put(self, context_id: str, key: str, value: Any) -> Dict[str, Any]:
+        text, size = _encode(key, value); self._check(context_id, size); now = time.time()
+        with self._lock:
+            self.stats["puts"] += 1; self._expire(now)
+            c = self._touch(context_id, now)
+            if c is None: c = self._ctx[context_id] = {"items": OrderedDict(), "bytes": 0, "atime": now}
+            old = c["items"].pop(key, None)
+            if old is not None: c["bytes"] -= old[1]; self._bytes -= old[1]
+            c["items"][key] = (text, size); c["bytes"] += size; self._bytes += size
+            while c["bytes"] > self.max_context_bytes: self._evict_one(c)
+            while self._bytes > self.max_bytes:
+                lru_id, lru = next(iter(self._ctx.items()))  # never c: c is the most recent and alone fits max_bytes
+                self._evict_one(lru)
+                if not lru["items"]: self._drop(lru_id)
+            return {"ok": True, "num_keys": len(c["items"]), "context_bytes": c["bytes"]}
+
+    def get(self, context_id: str, key: str) -> Dict[str, Any]:
+        if not context_id: raise HTTPException(400, "context_id required")
+        now = time.time()
+        with self._lock:
+            self.stats["gets"] += 1; self._expire(now)
+            c = self._touch(context_id, now); hit = c["items"].get(key) if c is not None else None
+            if hit is None: self.stats["misses"] += 1; return {"ok": False, "value": None}
+            c["items"].move_to_end(key)
+        return {"ok": True, "value": json.loads(hit[0])}
+
+    def release(self, context_id: str) -> Dict[str, Any]:
+        if not context_id: raise HTTPException(400, "context_id required")
+        with self._lock:
+            n = self._drop(context_id) if context_id in self._ctx else 0
+            self.stats["released_contexts"] += int(n > 0)
+        return {"ok": True, "released_keys": n}
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock: return {"backend": "memory", **self.stats, "contexts": len(self._ctx), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                                 "max_context_bytes": self.max_context_bytes, "ttl_sec": self.ttl_sec}
+
+class SqliteKV(_Limits):
+    """SQLite backend (WAL, memory-mapped reads): survives restarts and is shared by every tools-hub process using the same file."""
+    SWEEP_EVERY_SEC = 1.0
+
+    def __init__(self, path: str, max_bytes: int = 64 << 20, max_context_bytes: int = 4 << 20, ttl_sec: float = 3600.0, mmap_bytes: int = 256 << 20):
+        super().__init__(max_bytes, max_context_bytes, ttl_sec)
+        self.path = path; self.mmap_bytes = int(mmap_bytes); self._local = threading.local(); self._last_sweep = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS kv (ctx TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, size INTEGER NOT NULL,
+                                               atime REAL NOT NULL, PRIMARY KEY (ctx, key)) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS kv_atime ON kv (atime);
+                CREATE TABLE IF NOT EXISTS ctx (ctx TEXT PRIMARY KEY, bytes INTEGER NOT NULL, atime REAL NOT NULL) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS ctx_atime ON ctx (atime);""")
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; the database file itself is the only shared state
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL"); db.execute("PRAGMA synchronous=NORMAL"); db.execute(f"PRAGMA mmap_size={self.mmap_bytes}")
+            self._local.db = db
+        return db
+
+    def _drop(self, db: sqlite3.Connection, context_id: str) -> int:
+        n = db.execute("DELETE FROM kv WHERE ctx = ?", (context_id,)).rowcount
+        db.execute("DELETE FROM ctx WHERE ctx = ?", (context_id,)); return n
+
+    def _expire(self, db: sqlite3.Connection, now: float):
+        if self.ttl_sec <= 0 or now - self._last_sweep < self.SWEEP_EVERY_SEC: return
+        self._last_sweep = now
+        for (cid,) in db.execute("SELECT ctx FROM ctx WHERE atime < ?", (now - self.ttl_sec,)).fetchall():
+            self._drop(db, cid); self.stats["expired_contexts"] += 1
+
+    def _evict(self, db: sqlite3.Connection, where: str, args: Tuple, over: int):
+        # deletes least-recently-used entries (optionally within one context) until `over` bytes are freed
+        touched = set()
+        while over > 0:
+            rows = db.execute(f"SELECT ctx, key, size FROM kv {where} ORDER BY atime LIMIT 64", args).fetchall()
+            if not rows: break
+            for cid, key, size in rows:
+                if over <= 0: break
+                touched.add(cid); over -= size; self.stats["evictions"] += 1
+                db.execute("DELETE FROM kv WHERE ctx = ? AND key = ?", (cid, key)); db.execute("UPDATE ctx SET bytes = bytes - ? WHERE ctx = ?", (size, cid))
+        db.executemany("DELETE FROM ctx WHERE ctx = ? AND bytes <= 0", [(cid,) for cid in touched])
+
+    def put(self, context_id: str, key: str, value: Any) -> Dict[str, Any]:
+        text, size = _encode(key, value); self._check(context_id, size); now = time.time(); db = self._conn()
+        self.stats["puts"] += 1
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire(db, now)
+            row = db.execute("SELECT size FROM kv WHERE ctx = ? AND key = ?", (context_id, key)).fetchone(); delta = size - (row[0] if row else 0)
+            db.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?, ?)", (context_id, key, text, size, now))
+            db.execute("INSERT INTO ctx VALUES (?, ?, ?) ON CONFLICT(ctx) DO UPDATE SET bytes = bytes + ?, atime = ?", (context_id, delta, now, delta, now))
+            ctx_bytes = db.execute("SELECT bytes FROM ctx WHERE ctx = ?", (context_id,)).fetchone()[0]
+            if ctx_bytes > self.max_context_bytes: self._evict(db, "WHERE ctx = ? AND key != ?", (context_id, key), ctx_bytes - self.max_context_bytes)
+            total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM ctx").fetchone()[0]
+            if total > self.max_bytes: self._evict(db, "WHERE NOT (ctx = ? AND key = ?)", (context_id, key), total - self.max_bytes)
+            n, ctx_bytes = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM kv WHERE ctx = ?", (context_id,)).fetchone()
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK"); raise
+        return {"ok": True, "num_keys": n, "context_bytes": ctx_bytes}
+
+    def get(self, context_id: str, key: str) -> Dict[str, Any]:
+        if not context_id: raise HTTPException(400, "context_id required")
+        now = time.time(); db = self._conn(); self.stats["gets"] += 1
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._expire(db, now)
+            row = db.execute("SELECT value FROM kv WHERE ctx = ? AND key = ?", (context_id, key)).fetchone()
+            if row is not None:
+                db.execute("UPDATE kv SET atime = ? WHERE ctx = ? AND key = ?", (now, context_id, key))
+                db.execute("UPDATE ctx SET atime = ? WHERE ctx = ?", (now, context_id))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK"); raise
+        if row is None: self.stats["misses"] += 1; return {"ok": False, "value": None}
+        return {"ok": True, "value": json.loads(row[0])}
+
+    def release(self, context_id: str) -> Dict[str, Any]:
+        if not context_id: raise HTTPException(400, "context_id required")
+        db = self._conn(); db.execute("BEGIN IMMEDIATE")
+        try: n = self._drop(db, context_id); db.execute("COMMIT")
+        except BaseException: db.execute("ROLLBACK"); raise
+        self.stats["released_contexts"] += int(n > 0)
+        return {"ok": True, "released_keys": n}
+
+    def info(self) -> Dict[str, Any]:
+        contexts, used = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM ctx").fetchone()
+        return {"backend": "sqlite", "path": self.path, **self.stats, "contexts": contexts, "bytes": used, "max_bytes": self.max_bytes,
+                "max_context_bytes": self.max_context_bytes, "ttl_sec": self.ttl_sec}
+
+def kv_from_env() -> Any:
+    """TOOLS_KV_BACKEND=memory (default) | sqlite, with TOOLS_KV_PATH, TOOLS_KV_MAX_MB, TOOLS_KV_CONTEXT_MAX_MB and TOOLS_KV_TTL_SEC."""
+    import tempfile
+    limits = dict(max_bytes=int(float(os.getenv("TOOLS_KV_MAX_MB", "64")) * (1 << 20)),
+                  max_context_bytes=int(float(os.getenv("TOOLS_KV_CONTEXT_MAX_MB", "4")) * (1 << 20)), ttl_sec=float(os.getenv("TOOLS_KV_TTL_SEC", "3600")))
+    backend = os.getenv("TOOLS_KV_BACKEND", "memory").lower()
+    if backend == "sqlite": return SqliteKV(os.getenv("TOOLS_KV_PATH", os.path.join(tempfile.gettempdir(), "agentify_kv.sqlite3")), **limits)
+    if backend != "memory": raise ValueError(f"TOOLS_KV_BACKEND must be memory or sqlite, not {backend!r}")
+    return MemoryKV(**limits)
@@ -0,0 +1,170 @@
+from __future__ import annotations
+import math, os, pathlib, re, sqlite3, sys, threading, time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from tools.html_fast import ParseCache, parse_html
+
+# Offline full-text search for google_search: an inverted index with BM25 ranking over local document directories,
+# stored in SQLite. refresh() stats every file and (re)indexes only the new or changed ones; start() runs it from a
+# background thread right away and then every refresh_sec, so queries only ever read the current index. Each posting keeps the term's first character offset, which lets snippets be cut from the stored text
+# without rescanning the document. Results follow the google_search contract: [{"title", "link", "snippet"}].
+
+EXTENSIONS = {".html", ".htm", ".txt"}
+_TOKEN = re.compile(r"\w+")
+_TITLE = re.compile(r"<title[^>]*>(.*?)</title>", re.I | re.S)
+_STOP = frozenset("a an and are as at be by for from has in is it its of on or that the to was were will with what which who how did does do".split())
+K1, B = 1.2, 0.75
+SNIPPET_CHARS = 240
+
+def tokens(text: str) -> List[Tuple[str, int]]:
+    return [(m.group().lower(), m.start()) for m in _TOKEN.finditer(text) if m.group().lower() not in _STOP]
+
+class SearchIndex:
+    def __init__(self, path: str, roots: Sequence[Tuple[str, pathlib.Path]], refresh_sec: float = 60.0, cache_entries: int = 1024):
+        """roots are (url_prefix, directory) pairs; a document's link is url_prefix + its path relative to the directory.
+        A prefix starting with "/" is resolved against TOOLS_BASE_URL at query time, so each hub worker links to itself."""
+        self.path = path; self.roots = [(p, pathlib.Path(d)) for p, d in roots]; self.refresh_sec = float(refresh_sec)
+        self.cache = ParseCache(max_entries=cache_entries); self._local = threading.local(); self._build_lock = threading.Lock()
+        self._checked = 0.0; self._stats: Optional[Tuple[int, float]] = None; self._fingerprint: Any = None; self.generation = 0
+        self._thread: Optional[threading.Thread] = None; self._start_lock = threading.Lock(); self._stop = threading.Event()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, root TEXT NOT NULL, rel TEXT NOT NULL, title TEXT, text TEXT NOT NULL,
+                                             length INTEGER NOT NULL, mtime REAL NOT NULL, size INTEGER NOT NULL, UNIQUE (root, rel));
+            CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, doc INTEGER NOT NULL, tf INTEGER NOT NULL, pos INTEGER NOT NULL,
+                                                 PRIMARY KEY (term, doc)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);""")
+        self._load_stats(self._conn())  # an index left by an earlier run is searchable before the first rescan finishes
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL"); db.execute("PRAGMA synchronous=NORMAL"); self._local.db = db
+        return db
+
+    def _scan(self) -> Dict[Tuple[str, str], Tuple[float, int, pathlib.Path]]:
+        found = {}
+        for prefix, d in self.roots:
+            if not d.is_dir(): continue
+            for p in d.rglob("*"):
+                if p.suffix.lower() in EXTENSIONS and p.is_file():
+                    st = p.stat(); found[(prefix, p.relative_to(d).as_posix())] = (st.st_mtime, st.st_size, p)
+        return found
+
+    def refresh(self, force: bool = False) -> Dict[str, int]:
+        """Brings the index up to date with the document directories; returns counts of added, updated and removed docs."""
+        now = time.time()
+        if not force and now - self._checked < self.refresh_sec: return {"added": 0, "updated": 0, "removed": 0}
+        with self._build_lock:
+            if not force and now - self._checked < self.refresh_sec: return {"added": 0, "updated": 0, "removed": 0}
+            db = self._conn(); found = self._scan(); counts = {"added": 0, "updated": 0, "removed": 0}
+            known = {(r, rel): (i, m, s) for i, r, rel, m, s in db.execute("SELECT id, root, rel, mtime, size FROM docs")}
+            for key, (i, _, _) in known.items():
+                if key not in found: self._delete(db, i); counts["removed"] += 1
+            for key, (mtime, size, p) in found.items():
+                old = known.get(key)
+                if old is not None and old[1] == mtime and old[2] == size: continue
+                self._add(db, key, p, mtime, size, None if old is None else old[0]); counts["updated" if old else "added"] += 1
+            # re-read even when nothing changed here: another hub process sharing the file may have indexed documents
+            self._load_stats(db); self._checked = now
+            return counts
+
+    def _load_stats(self, db: sqlite3.Connection):
+        n, total, last = db.execute("SELECT COUNT(*), COALESCE(SUM(length), 0), MAX(id) FROM docs").fetchone()
+        if (n, total, last) != self._fingerprint: self._fingerprint = (n, total, last); self._stats = (n, total / n if n else 0.0); self.generation += 1
+
+    def start(self) -> "SearchIndex":
+        """Starts the background refresher (once): a full refresh now, then one every refresh_sec."""
+        if self._thread is not None: return self
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="search-index-refresh", daemon=True); self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            try: self.refresh(force=True)
+            except Exception as e: print(f"search index refresh failed: {type(e).__name__}: {e}", file=sys.stderr)
+            if self._stop.wait(self.refresh_sec): return
+
+    def _delete(self, db: sqlite3.Connection, doc: int):
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("DELETE FROM postings WHERE doc = ?", (doc,)); db.execute("DELETE FROM docs WHERE id = ?", (doc,)); db.execute("COMMIT")
+
+    def _add(self, db: sqlite3.Connection, key: Tuple[str, str], p: pathlib.Path, mtime: float, size: int, old: Optional[int]):
+        raw = p.read_text(encoding="utf-8", errors="replace")
+        if p.suffix.lower() == ".txt": text, title = raw, None
+        else:
+            text = parse_html(raw, tables=False)[0]; m = _TITLE.search(raw)
+            title = re.sub(r"\s+", " ", m.group(1)).strip() if m else None
+        toks = tokens(text); tf = Counter(t for t, _ in toks); first: Dict[str, int] = {}
+        for t, pos in toks: first.setdefault(t, pos)
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if old is not None: db.execute("DELETE FROM postings WHERE doc = ?", (old,)); db.execute("DELETE FROM docs WHERE id = ?", (old,))
+            cur = db.execute("INSERT OR REPLACE INTO docs (root, rel, title, text, length, mtime, size) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (key[0], key[1], title or text.strip().split("\n", 1)[0][:120] or key[1], text, len(toks), mtime, size))
+            db.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?, ?)", [(t, cur.lastrowid, n, first[t]) for t, n in tf.items()])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK"); raise
+
+    def _snippet(self, db: sqlite3.Connection, doc: int, offsets: List[int]) -> str:
+        # the window around the term occurrence that has the most other query-term occurrences nearby
+        best = max(offsets, key=lambda o: sum(1 for x in offsets if o - SNIPPET_CHARS // 3 <= x <= o + SNIPPET_CHARS * 2 // 3))
+        start = max(0, best - SNIPPET_CHARS // 3)
+        raw, = db.execute("SELECT substr(text, ?, ?) FROM docs WHERE id = ?", (start + 1, SNIPPET_CHARS, doc)).fetchone()
+        s = re.sub(r"\s+", " ", raw).strip()
+        return ("…" if start > 0 else "") + s + ("…" if len(raw) == SNIPPET_CHARS else "")
+
+    def search(self, query: str, top_n: int = 5) -> List[Dict[str, Any]]:
+        self.start()  # normally already running (create_app starts it); never waits for a rescan
+        terms = list(dict.fromkeys(t for t, _ in tokens(query)))
+        key = f"{self.generation}\x00{top_n}\x00{' '.join(terms)}"
+        hit = self.cache.get(key)
+        if hit is not None: return hit
+        n_docs, avgdl = self._stats or (0, 0.0); db = self._conn()
+        scores: Dict[int, float] = {}; offsets: Dict[int, List[int]] = {}
+        for t in terms:
+            rows = db.execute("SELECT p.doc, p.tf, p.pos, d.length FROM postings p JOIN docs d ON d.id = p.doc WHERE p.term = ?", (t,)).fetchall()
+            if not rows: continue
+            idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            for doc, tf, pos, length in rows:
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / (avgdl or 1)))
+                offsets.setdefault(doc, []).append(pos)
+        base = os.getenv("TOOLS_BASE_URL", "http://127.0.0.1:7001").rstrip("/"); out = []
+        for doc in sorted(scores, key=lambda d: (-scores[d], d))[:max(0, top_n)]:
+            root, rel, title = db.execute("SELECT root, rel, title FROM docs WHERE id = ?", (doc,)).fetchone()
+            link = (base + root if root.startswith("/") else root) + rel
+            out.append({"title": title, "link": link, "snippet": self._snippet(db, doc, offsets[doc])})
+        self.cache.put(key, out)
+        return out
+
+    def info(self) -> Dict[str, Any]:
+        n, avgdl = self._stats or (None, None)
+        return {"path": self.path, "docs": n, "avg_doc_tokens": None if avgdl is None else round(avgdl, 1), "generation": self.generation,
+                "roots": [[p, str(d)] for p, d in self.roots], "query_cache": self.cache.info()}
+
+def roots_from_env(static_dir: str) -> List[Tuple[str, pathlib.Path]]:
+    """tools/static (served at /static/) plus TOOLS_SEARCH_DIRS: os.pathsep-separated `dir` or `dir=url_prefix` entries.
+    A directory without a url_prefix is served by the tools hub under /corpus/<n>/."""
+    roots = [("/static/", pathlib.Path(static_dir))]
+    for i, entry in enumerate(e for e in os.getenv("TOOLS_SEARCH_DIRS", "").split(os.pathsep) if e.strip()):
+        d, _, prefix = entry.partition("=")
+        roots.append((prefix or f"/corpus/{i}/", pathlib.Path(d).expanduser().resolve()))
+    return roots
+
+if __name__ == "__main__":
+    # prebuild or refresh the on-disk index: python -m tools.search_index [--query "apple net sales"]
+    import argparse, json, tempfile
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index", default=os.getenv("TOOLS_SEARCH_INDEX", os.path.join(tempfile.gettempdir(), "agentify_search.sqlite3")))
+    ap.add_argument("--query", default=None); ap.add_argument("--top-n", type=int, default=5)
+    args = ap.parse_args()
+    ix = SearchIndex(args.index, roots_from_env(os.path.join(os.path.dirname(__file__), "static")))
+    t0 = time.perf_counter(); print(json.dumps({**ix.refresh(force=True), "sec": round(time.perf_counter() - t0, 3), **ix.info()}))
+    if args.query: print(json.dumps(ix.search(args.query, args.top_n), ensure_ascii=False, indent=2))
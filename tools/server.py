@@ -1,107 +1,220 @@
 from __future__ import annotations
-import os, re
-from typing import Any, Dict, List, Optional
+import os, tempfile, time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import FastAPI, Body, HTTPException
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
-import requests
-from bs4 import BeautifulSoup
-try:
-    from duckduckgo_search import DDGS
-except Exception:
-    DDGS = None
+from tools.http_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB, HttpCache, SessionPool
+from tools.doc_store import DocStore
+from tools.html_fast import ParseCache, parse_html, parse_html_bs4 as _html_parse_bs4, tables_from_html
+from tools.tables import TableIndex
+from tools.kv_store import kv_from_env
+from tools.search_index import SearchIndex, roots_from_env
+from tools.extract import KINDS, extract_mentions, first_billions
+from common.metrics import Registry, instrument
 
 app = FastAPI(title="Agentify Tools Hub")
-KV: Dict[str, Dict[str, Any]] = {}
+KV = kv_from_env()
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+SEARCH = SearchIndex(os.getenv("TOOLS_SEARCH_INDEX", os.path.join(tempfile.gettempdir(), "agentify_search.sqlite3")), roots_from_env(STATIC_DIR),
+                     refresh_sec=float(os.getenv("TOOLS_SEARCH_REFRESH_SEC", "60")), cache_entries=int(os.getenv("TOOLS_SEARCH_CACHE_SIZE", "1024")))
+SEARCH_BACKEND = os.getenv("TOOLS_SEARCH_BACKEND", "auto").lower()  # auto: SerpAPI when SERPAPI_KEY is set, else the local index
+if SEARCH_BACKEND not in ("auto", "local", "serpapi", "ddg"): raise ValueError(f"TOOLS_SEARCH_BACKEND must be auto, local, serpapi or ddg, not {SEARCH_BACKEND!r}")
+SESSIONS = SessionPool()
+HTTP_CACHE = HttpCache(os.getenv("TOOLS_CACHE_DIR", DEFAULT_CACHE_DIR),
+                       max_bytes=int(float(os.getenv("TOOLS_CACHE_MAX_MB", str(DEFAULT_CACHE_MAX_MB))) * (1 << 20)),
+                       ttl_sec=float(os.getenv("TOOLS_CACHE_TTL_SEC", "300")), sessions=SESSIONS)
+DOCS = DocStore(max_bytes=int(float(os.getenv("TOOLS_DOC_STORE_MAX_MB", "128")) * (1 << 20)))
+PARSE_CACHE = ParseCache(max_entries=int(os.getenv("TOOLS_PARSE_CACHE_SIZE", "256")))
+TABLE_INDEX = ParseCache(max_entries=int(os.getenv("TOOLS_PARSE_CACHE_SIZE", "256")))
+HTML_ENGINE = os.getenv("TOOLS_HTML_ENGINE", "lxml")  # "bs4" selects the original BeautifulSoup path
+TOOL_NAMES = ("google_search", "http_fetch", "html_parse", "table_lookup", "kv_put", "kv_get", "kv_release", "finance_extract_mentions", "finance_calc_extract_first_billions")
+METRICS = Registry()
+TOOL_SECONDS = METRICS.histogram("tools_call_duration_seconds", "Tool execution time, excluding HTTP overhead", ("tool", "outcome"))
+STAGE_SECONDS = METRICS.histogram("tools_stage_duration_seconds", "Time in parse/index/extract work that is not served from a cache", ("stage",))
+FETCH_BYTES = METRICS.counter("tools_fetch_bytes_total", "Body bytes returned by http_fetch, by cache outcome", ("cache",))
+instrument(app, METRICS, "tools")
 
 class ToolCallRequest(BaseModel):
     tool: str
     args: Dict[str, Any] = Field(default_factory=dict)
     context_id: Optional[str] = None
 
+class BatchCallRequest(BaseModel):
+    # an arg value {"$ref": i, "key": "text"} is replaced by result i (or result i's "key" field) before the call runs
+    calls: List[ToolCallRequest]
+    context_id: Optional[str] = None
+    max_parallel: int = Field(default=8, ge=1, le=64)
+
 def _google_search(query: str, top_n: int = 5) -> List[Dict[str, Any]]:
     serpapi_key = os.getenv("SERPAPI_KEY")
-    if serpapi_key:
+    if SEARCH_BACKEND == "local" or (SEARCH_BACKEND == "auto" and not serpapi_key):
+        with STAGE_SECONDS.time(stage="local_search"): return SEARCH.search(query, top_n)
+    if SEARCH_BACKEND == "serpapi" and not serpapi_key: raise HTTPException(503, "TOOLS_SEARCH_BACKEND=serpapi but SERPAPI_KEY is empty")
+    if serpapi_key and SEARCH_BACKEND in ("auto", "serpapi"):
         url = "https://serpapi.com/search.json"
         params = {"q": query, "engine": "google", "api_key": serpapi_key}
-        r = requests.get(url, params=params, timeout=30); r.raise_for_status()
+        r = SESSIONS.get(url).get(url, params=params, timeout=30); r.raise_for_status()
         data = r.json()
         return [{"title": it.get("title"), "link": it.get("link"), "snippet": it.get("snippet")} 
                 for it in (data.get("organic_results") or [])[:top_n]]
-    if DDGS is None:
-        raise HTTPException(503, "No search backend available")
+    try: from duckduckgo_search import DDGS  # imported on first use: only this fallback needs it
+    except Exception: raise HTTPException(503, "No search backend available")
     with DDGS() as ddgs:
         out = []
         for res in ddgs.text(query, max_results=top_n or 5):
             out.append({"title": res.get("title"), "link": res.get("href") or res.get("url"), "snippet": res.get("body")})
         return out
 
-def _http_fetch(url: str, timeout: int = 30) -> Dict[str, Any]:
-    r = requests.get(url, headers={"User-Agent": "agentify/0.1"}, timeout=timeout)
-    r.raise_for_status()
-    ct = r.headers.get("content-type","").lower()
+def _text_arg(a: Dict[str, Any], key: str) -> str:
+    # text-taking tools accept the raw text under `key`, a `doc_id` handle, or a list of `doc_ids` joined by newlines
+    if a.get("doc_id"): return DOCS.get(a["doc_id"])
+    if a.get("doc_ids"): return "\n".join(DOCS.get(d) for d in a["doc_ids"])
+    return a.get(key) or ""
+
+def _http_fetch(url: str, timeout: int = 30, use_cache: bool = True, handle: bool = False) -> Dict[str, Any]:
+    meta, body, cache = HTTP_CACHE.fetch(url, timeout=timeout, use_cache=use_cache)
+    FETCH_BYTES.inc(len(body), cache=cache)
+    ct = meta["content_type"]
     if "html" in ct or "text" in ct:
-        return {"status": r.status_code, "content_type": ct, "text": r.text}
-    return {"status": r.status_code, "content_type": ct, "bytes_len": len(r.content)}
-
-def _html_parse(html: str) -> Dict[str, Any]:
-    soup = BeautifulSoup(html, "lxml")
-    for s in soup(["script","style"]): s.extract()
-    text = soup.get_text(separator="\n", strip=True)
-    links = [{"text": a.get_text(strip=True), "href": a.get("href")} for a in soup.find_all("a", href=True)]
-    return {"text": text, "links": links, "tables": []}
-
-def _kv_put(context_id: str, key: str, value: Any) -> Dict[str, Any]:
-    if not context_id: raise HTTPException(400, "context_id required")
-    KV.setdefault(context_id, {})[key] = value
-    return {"ok": True, "keys": list(KV[context_id].keys())}
-
-def _kv_get(context_id: str, key: str) -> Dict[str, Any]:
-    if not context_id: raise HTTPException(400, "context_id required")
-    return {"ok": key in KV.get(context_id, {}), "value": KV.get(context_id, {}).get(key)}
-
-def _parse_billions(text: str) -> Optional[float]:
-    s = text.replace(",", "")
-    m = re.search(r"\$?([\d]+(\.\d+)?)\s*(million|billion)", s, flags=re.I)
-    if not m: return None
-    val = float(m.group(1))
-    unit = m.group(3).lower()
-    if unit.startswith("million"): return val/1000.0
-    return val
+        text = body.decode(meta["encoding"], errors="replace")
+        if handle: return {"status": meta["status"], "content_type": ct, "doc_id": DOCS.put(text), "chars": len(text), "cache": cache}
+        return {"status": meta["status"], "content_type": ct, "text": text, "cache": cache}
+    return {"status": meta["status"], "content_type": ct, "bytes_len": len(body), "cache": cache}
+
+def _parse_cached(html: str, key: str) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    parsed = PARSE_CACHE.get(key)
+    if parsed is None:
+        try:
+            with STAGE_SECONDS.time(stage="html_parse"): parsed = (*_html_parse_bs4(html), tables_from_html(html)) if HTML_ENGINE == "bs4" else parse_html(html)
+        except ModuleNotFoundError as e:
+            # TOOLS_HTML_ENGINE=bs4 and pages with content after </body> or </html> (e.g. a trailing script) go through bs4
+            if e.name != "bs4": raise
+            raise HTTPException(503, "html_parse needs beautifulsoup4 for this page (content after </body> or </html>, or TOOLS_HTML_ENGINE=bs4); install it from requirements.txt")
+        PARSE_CACHE.put(key, parsed)
+    return parsed
+
+def _html_parse(html: str, handle: bool = False, tables: bool = True) -> Dict[str, Any]:
+    text, links, tbls = _parse_cached(html, ParseCache.key(html))
+    if not tables: tbls = []
+    if handle: return {"doc_id": DOCS.put(text), "chars": len(text), "links": links, "tables": tbls}
+    return {"text": text, "links": links, "tables": tbls}
+
+def _table_lookup(html: str, row: str, col: Optional[str] = None, table: Optional[int] = None, limit: int = 20) -> Dict[str, Any]:
+    if not row: raise HTTPException(400, "row label required")
+    key = ParseCache.key(html); ix = TABLE_INDEX.get(key)
+    if ix is None:
+        tables = _parse_cached(html, key)[2]
+        with STAGE_SECONDS.time(stage="table_index"): ix = TableIndex(tables)
+        TABLE_INDEX.put(key, ix)
+    return {"matches": ix.lookup(row, col, table, limit)}
+
 
 @app.get("/tools")
 def get_tools():
     base_url = os.getenv("TOOLS_BASE_URL", "http://127.0.0.1:7001")
     return {"base_url": base_url, "tools":[
-        {"name":"google_search","desc":"Web search (SerpAPI or DDG)"},
-        {"name":"http_fetch","desc":"HTTP GET content"},
-        {"name":"html_parse","desc":"Parse HTML to text/links/tables"},
-        {"name":"kv_put","desc":"KV set (per context_id)"},
+        {"name":"google_search","desc":"Search: local BM25 index over tools/static + TOOLS_SEARCH_DIRS (default offline), SerpAPI or DDG"},
+        {"name":"http_fetch","desc":"HTTP GET content (disk-cached; pass cache=false to bypass, handle=true to get a doc_id instead of text)"},
+        {"name":"html_parse","desc":"Parse HTML (html or doc_id) to text/links/tables (columnar, numbers normalized); handle=true returns the text as a doc_id, tables=false omits tables"},
+        {"name":"table_lookup","desc":"Look up table cells in HTML (html or doc_id) by row label and optional col label/table id"},
+        {"name":"kv_put","desc":"KV set (per context_id; bounded, LRU-evicted, idle contexts expire); returns num_keys"},
         {"name":"kv_get","desc":"KV get (per context_id)"},
-        {"name":"finance_calc_extract_first_billions","desc":"Extract first $X billion/million from text"}
+        {"name":"kv_release","desc":"Drop all KV state of context_id (the evaluator calls this when a task finishes)"},
+        {"name":"finance_extract_mentions","desc":"All money/EPS/percent mentions in text, doc_id or doc_ids with offset, normalized value, unit and sentence"},
+        {"name":"finance_calc_extract_first_billions","desc":"Extract first $X billion/million from text, doc_id or doc_ids"}
     ]}
 
-@app.post("/call")
-def call_tool(req: ToolCallRequest = Body(...)):
-    t = req.tool; a = req.args or {}
-    if t == "google_search": return {"ok": True, "result": _google_search(a.get("query",""), int(a.get("top_n",5)))}
-    if t == "http_fetch":    return {"ok": True, "result": _http_fetch(a.get("url"), int(a.get("timeout",30)))}
-    if t == "html_parse":    return {"ok": True, "result": _html_parse(a.get("html",""))}
-    if t == "kv_put":        return {"ok": True, "result": _kv_put(req.context_id, a.get("key"), a.get("value"))}
-    if t == "kv_get":        return {"ok": True, "result": _kv_get(req.context_id, a.get("key"))}
+def run_tool(t: str, a: Dict[str, Any], context_id: Optional[str]) -> Any:
+    if t == "google_search": return _google_search(a.get("query",""), int(a.get("top_n",5)))
+    if t == "http_fetch":    return _http_fetch(a.get("url"), int(a.get("timeout",30)), bool(a.get("cache", True)), bool(a.get("handle", False)))
+    if t == "html_parse":    return _html_parse(_text_arg(a, "html"), bool(a.get("handle", False)), bool(a.get("tables", True)))
+    if t == "table_lookup":  return _table_lookup(_text_arg(a, "html"), a.get("row",""), a.get("col"), None if a.get("table") is None else int(a["table"]), int(a.get("limit",20)))
+    if t == "kv_put":        return KV.put(context_id, a.get("key") or "", a.get("value"))
+    if t == "kv_get":        return KV.get(context_id, a.get("key") or "")
+    if t == "kv_release":    return KV.release(context_id)
+    if t == "finance_extract_mentions":
+        kinds = a.get("kinds")
+        if kinds and not set(kinds) <= set(KINDS): raise HTTPException(400, f"kinds must be a subset of {list(KINDS)}")
+        text = _text_arg(a, "text")
+        with STAGE_SECONDS.time(stage="extract_mentions"): return extract_mentions(text, kinds, None if a.get("limit") is None else int(a["limit"]), bool(a.get("with_sentence", True)))
     if t == "finance_calc_extract_first_billions":
-        val = None; ev = None
-        text = a.get("text","")
-        for line in text.splitlines():
-            v = _parse_billions(line)
-            if v is not None:
-                val = v; ev = line.strip(); break
-        return {"ok": True, "result": {"value_billions": val, "evidence": ev}}
+        text = _text_arg(a, "text")
+        with STAGE_SECONDS.time(stage="extract_first_billions"): return first_billions(text)
     raise HTTPException(404, f"Unknown tool {t}")
 
-app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "static")), name="static")
+def _run_timed(t: str, a: Dict[str, Any], context_id: Optional[str]) -> Tuple[Any, float]:
+    """run_tool plus its latency in ms, which also goes to the tools_call_duration_seconds histogram."""
+    t0 = time.perf_counter(); outcome = "error"
+    try:
+        out = run_tool(t, a, context_id); outcome = "ok"
+        return out, round((time.perf_counter() - t0) * 1000, 3)
+    finally: TOOL_SECONDS.observe(time.perf_counter() - t0, tool=t if t in TOOL_NAMES else "unknown", outcome=outcome)
+
+@app.post("/call")
+def call_tool(req: ToolCallRequest = Body(...)):
+    result, ms = _run_timed(req.tool, req.args or {}, req.context_id)
+    return {"ok": True, "result": result, "elapsed_ms": ms}
+
+def _check_refs(calls: List[ToolCallRequest]):
+    # rejects the whole batch before anything runs, so a bad $ref is a 400 naming the call rather than a worker exception
+    for i, c in enumerate(calls):
+        for k, v in (c.args or {}).items():
+            if not (isinstance(v, dict) and "$ref" in v): continue
+            j = v["$ref"]
+            if type(j) is not int or not 0 <= j < i: raise HTTPException(400, f"call {i}: arg {k!r} has $ref {j!r}; it must be the index of an earlier call")
+            if v.get("key") is not None and not isinstance(v["key"], str): raise HTTPException(400, f"call {i}: arg {k!r} has a non-string $ref key")
+
+def _resolve_refs(i: int, args: Dict[str, Any], futures: List[Future]) -> Dict[str, Any]:
+    out = {}
+    for k, v in args.items():
+        if isinstance(v, dict) and "$ref" in v:
+            j = v["$ref"]; dep = futures[j].result()
+            if not dep["ok"]: raise HTTPException(424, f"call {i}: dependency {j} failed")
+            val = dep["result"]
+            if v.get("key") is not None:
+                if not isinstance(val, dict) or v["key"] not in val: raise HTTPException(424, f"call {i}: result {j} has no key {v['key']!r}")
+                val = val[v["key"]]
+            v = val
+        out[k] = v
+    return out
+
+@app.post("/call_batch")
+def call_batch(req: BatchCallRequest = Body(...)):
+    """Runs a list of tool calls server-side. Independent calls run in parallel; a call waits only on the calls it $refs.
+
+    Each entry is {"ok": True, "result": ..., "elapsed_ms": float} or {"ok": False, "status": int, "error": str, "skipped": bool};
+    skipped means the call never ran because one of its dependencies failed. elapsed_ms excludes time spent waiting on $refs.
+    """
+    _check_refs(req.calls); futures: List[Future] = []
+    def run(i: int, c: ToolCallRequest) -> Dict[str, Any]:
+        try: args = _resolve_refs(i, c.args or {}, futures)
+        except HTTPException as e: return {"ok": False, "status": e.status_code, "error": e.detail, "skipped": e.status_code == 424}
+        try:
+            result, ms = _run_timed(c.tool, args, c.context_id or req.context_id)
+            return {"ok": True, "result": result, "elapsed_ms": ms}
+        except HTTPException as e: return {"ok": False, "status": e.status_code, "error": e.detail, "skipped": False}
+        except Exception as e: return {"ok": False, "status": 500, "error": f"{type(e).__name__}: {e}", "skipped": False}
+    # calls are queued in order and only reference earlier ones, so a waiting worker always depends on calls already running
+    with ThreadPoolExecutor(max_workers=min(req.max_parallel, max(1, len(req.calls)))) as pool:
+        for i, c in enumerate(req.calls): futures.append(pool.submit(run, i, c))
+        results = [f.result() for f in futures]
+    return {"ok": all(r["ok"] for r in results), "results": results}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {**HTTP_CACHE.info(), "doc_store": DOCS.info(), "parse_cache": PARSE_CACHE.info(), "table_index": TABLE_INDEX.info(), "kv": KV.info(),
+            "search": SEARCH.info()}
+
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+for _prefix, _dir in SEARCH.roots:  # search directories without an external url_prefix are served here so their links resolve
+    if _prefix.startswith("/corpus/"): app.mount(_prefix.rstrip("/"), StaticFiles(directory=str(_dir), check_dir=False), name=_prefix.strip("/"))
 
-def create_app(): return app
+def create_app():
+    # build and refresh the local search index in the background from startup, unless queries go to a network backend
+    if SEARCH_BACKEND == "local" or (SEARCH_BACKEND == "auto" and not os.getenv("SERPAPI_KEY")): SEARCH.start()
+    return app
 
 if __name__ == "__main__":
     import uvicorn, argparse
@@ -110,4 +223,4 @@ if __name__ == "__main__":
     p.add_argument("--port", type=int, default=7001)
     args = p.parse_args()
     os.environ.setdefault("TOOLS_BASE_URL", f"http://{args.host}:{args.port}")
-    uvicorn.run(app, host=args.host, port=args.port)
+    uvicorn.run(create_app(), host=args.host, port=args.port)
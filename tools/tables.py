@@ -0,0 +1,106 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Columnar tables for html_parse: each table is {"id", "caption", "scale", "columns", "rows", "data", "unscaled_rows"} where
+# data[j][i] is the value of row i under columns[j]. Numeric cells are normalized to floats in absolute units:
+# "1,234" -> 1234.0, "(1,234)" -> -1234.0, "$2.5 billion" -> 2.5e9, and a table captioned "(in millions)" is scaled by 1e6.
+# Percent cells keep their face value ("12%" -> 12.0). Blank, "$" and ")" filler cells become None. Under an
+# "(in millions, except per share ...)" caption, per-share/EPS rows (or rows under an "Earnings per share:" heading) keep
+# their face value too; those row indexes are listed in "unscaled_rows".
+
+_NUM = re.compile(r"^(\()?\s*([-−])?\s*[$€£]?\s*([-−])?\s*(\d[\d,]*(?:\.\d+)?|\.\d+)\s*"
+                  r"(%|thousands?|millions?|billions?|trillions?|k|mm?|bn?)?\s*(\))?$", re.I)
+_SCALE_WORDS = {"thousand": 1e3, "k": 1e3, "million": 1e6, "m": 1e6, "mm": 1e6, "billion": 1e9, "b": 1e9, "bn": 1e9, "trillion": 1e12}
+_TABLE_SCALE = re.compile(r"in\s+(thousands|millions|billions)", re.I)
+_EXCEPT_PER_SHARE = re.compile(r"except\b[^)]{0,80}?per[\s-]share", re.I)
+_PER_SHARE = re.compile(r"per[\s-]share|\beps\b", re.I)
+_SHARE_COUNT = re.compile(r"^\s*(?:weighted|shares|number of shares)", re.I)  # "Shares used in computing earnings per share"
+_FILLER = {"", "$", "€", "£", ")", "%", "(", "—", "–", "-"}
+_YEAR = re.compile(r"^(?:fy\s*)?(19|20)\d\d$", re.I)
+_WS = re.compile(r"\s+")
+
+def parse_number(text: str, scale: float = 1.0) -> Optional[float]:
+    m = _NUM.match(text.strip())
+    if not m: return None
+    val = float(m.group(4).replace(",", ""))
+    if m.group(1) or m.group(2) or m.group(3): val = -val
+    unit = (m.group(5) or "").lower()
+    if unit == "%": return val
+    if unit: return val * _SCALE_WORDS[unit.rstrip("s")]
+    return val * scale
+
+def detect_scale(text: str) -> float:
+    m = _TABLE_SCALE.search(text or "")
+    return _SCALE_WORDS[m.group(1).lower().rstrip("s")] if m else 1.0
+
+def norm_label(text: str) -> str:
+    return _WS.sub(" ", text or "").strip().rstrip(":").lower()
+
+def _is_header_row(cells: List[Tuple[str, bool]]) -> bool:
+    if cells and all(is_th for _, is_th in cells): return True
+    values = [t for t, _ in cells[1:] if t not in _FILLER]
+    return bool(values) and not cells[0][0] and all(_YEAR.match(t) or parse_number(t) is None for t in values)
+
+def build_table(tid: int, grid: List[List[Tuple[str, bool, bool]]], caption: Optional[str], context: str) -> Optional[Dict[str, Any]]:
+    """grid is the table's rows as (cell_text, is_th, spanned) with colspans already expanded: a cell spanning k columns
+    appears k times, the copies flagged as spanned. Returns None for empty tables."""
+    if not grid: return None
+    width = max(len(r) for r in grid)
+    full = [[(t, th) for t, th, _ in r] + [("", False)] * (width - len(r)) for r in grid]
+    # a <th> label covers every column it spans; any other value only its first one (header rows are told apart this way
+    # too, so a spanned value cannot make a body row look like a header or the other way round)
+    grid = [[(t if th or not sp else "", th) for t, th, sp in r] + [("", False)] * (width - len(r)) for r in grid]
+    n_head = 0
+    while n_head < len(grid) - 1 and _is_header_row(grid[n_head]): n_head += 1
+    # header rows label every column under their span, <td colspan=2>2024</td> over a "$" and a value cell included
+    head, body = full[:n_head], grid[n_head:]
+    scale_text = " ".join([caption or "", context] + [t for r in head for t, _ in r] + [body[0][0][0] if body else ""])
+    scale = detect_scale(scale_text); keep = [j for j in range(1, width) if any(r[j][0] not in _FILLER for r in body)]
+    unscaled: List[int] = []
+    if scale != 1.0 and _EXCEPT_PER_SHARE.search(scale_text):
+        section = False  # inside a label-only "Earnings per share:" heading row's block
+        for i, r in enumerate(body):
+            label = r[0][0]; per_share = bool(_PER_SHARE.search(label)) and not _SHARE_COUNT.match(label)
+            if all(r[j][0] in _FILLER for j in keep): section = per_share
+            elif per_share or (section and not _SHARE_COUNT.match(label)): unscaled.append(i)
+    row_scale = [scale] * len(body)
+    for i in unscaled: row_scale[i] = 1.0
+    columns = [" ".join(dict.fromkeys(r[j][0] for r in head if r[j][0])) or f"col{j}" for j in keep]
+    rows = [r[0][0] for r in body]
+    data: List[List[Any]] = []
+    for j in keep:
+        col: List[Any] = []
+        for r, s in zip(body, row_scale):
+            t = r[j][0]
+            if t in _FILLER: col.append(None); continue
+            v = parse_number(t, s); col.append(t if v is None else v)
+        data.append(col)
+    return {"id": tid, "caption": caption, "scale": scale, "columns": columns, "rows": rows, "data": data, "unscaled_rows": unscaled}
+
+class TableIndex:
+    """Label index over a document's columnar tables: row label -> [(table, row)], and per table column label -> column."""
+    def __init__(self, tables: List[Dict[str, Any]]):
+        self.tables = tables; self.rows: Dict[str, List[Tuple[int, int]]] = {}; self.cols: List[Dict[str, int]] = []
+        for ti, t in enumerate(tables):
+            for ri, label in enumerate(t["rows"]):
+                if label: self.rows.setdefault(norm_label(label), []).append((ti, ri))
+            self.cols.append({norm_label(c): ci for ci, c in enumerate(t["columns"])})
+
+    @staticmethod
+    def _match(query: str, keys) -> List[str]:
+        q = norm_label(query)
+        if q in keys: return [q]
+        return [k for k in keys if q and q in k]
+
+    def lookup(self, row: str, col: Optional[str] = None, table: Optional[int] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for rk in self._match(row, self.rows):
+            for ti, ri in self.rows[rk]:
+                if table is not None and ti != table: continue
+                t = self.tables[ti]
+                cis = [self.cols[ti][ck] for ck in self._match(col, self.cols[ti])] if col else range(len(t["columns"]))
+                for ci in cis:
+                    out.append({"table": t["id"], "row": t["rows"][ri], "column": t["columns"][ci], "value": t["data"][ci][ri]})
+                    if len(out) >= limit: return out
+        return out